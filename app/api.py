@@ -0,0 +1,239 @@
+"""JSON API over lib.recipe for clients other than the Streamlit pages (LINE bot, shortcuts, ...).
+
+uv run python api.py                      # DISH_API_WORKERS workers (default: CPU count) on port 8000
+uv run uvicorn api:app --workers 4 --port 8000
+
+Every worker process loads the menu catalog, ingredient index and recent history into lib.cache
+when it starts and serves suggestions from memory, taking them from lib.suggestion_pool where
+they are generated ahead of time. The caches revalidate against the repository
+on their usual TTLs, so a registration made through another worker is picked up within
+CACHE_TTLS["dish_history"] seconds.
+
+History, registration and suggestions belong to the household given by the ``household`` query
+parameter (DEFAULT_HOUSEHOLD when omitted); the catalog is shared by all households.
+"""
+
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from typing import Annotated
+
+import pandas as pd
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
+from lib.cache import (
+    CACHES,
+    apply_registered_history,
+    fetch_ingredient_index,
+    fetch_interval_history,
+    fetch_menu_catalog,
+    fetch_recent_menu_list,
+    prefetch,
+    recent_menu_caches,
+)
+from lib.metrics import configure_observability, registry, span
+from lib.planner import MAX_WEEKS, plan_weeks
+from lib.preference import get_preference_weights
+from lib.recipe import RECENT_MENU_LIMIT, register_dish_history
+from lib.repository import DEFAULT_HOUSEHOLD, HOUSEHOLD_PATTERN, today_in_japan
+from lib.shopping import aggregate_shopping_list
+from lib.snapshot import load_snapshot
+from lib.suggestion_pool import daily_suggestion_pool, prime_suggestion_pools, weekly_suggestion_pool
+from lib.util import Menu
+from pydantic import BaseModel
+from starlette.routing import Match
+
+# 世帯 ID (英数字・_・-)
+Household = Annotated[str, Query(pattern=HOUSEHOLD_PATTERN)]
+
+
+class MenuResponse(BaseModel):
+    name: str
+    season: str
+    holiday_only: bool
+    not_storable: bool
+    interval: int
+    cooking_method: str
+    main_ingredient: str
+    category: str | None
+
+    @classmethod
+    def from_menu(cls, menu: Menu) -> "MenuResponse":
+        return cls(
+            name=menu.name,
+            season=menu.season,
+            holiday_only=menu.holiday_only,
+            not_storable=menu.not_storable,
+            interval=menu.interval,
+            cooking_method=menu.cooking_method,
+            main_ingredient=menu.main_ingredient,
+            category=menu.category,
+        )
+
+
+class DaySuggestion(BaseModel):
+    date: date
+    dish: MenuResponse
+
+
+class WeekSuggestion(BaseModel):
+    days: list[DaySuggestion]
+
+
+class IngredientsRequest(BaseModel):
+    dishes: list[str]
+
+
+class DishIngredients(BaseModel):
+    name: str
+    ingredients: list[str]
+
+
+class IngredientsResponse(BaseModel):
+    dishes: list[DishIngredients]
+    totals: list[str]
+    unconverted: list[str]
+
+
+class HistoryEntry(BaseModel):
+    date: date
+    menu: str
+
+
+class HistoryRequest(BaseModel):
+    entries: list[HistoryEntry]
+
+
+class HistoryResponse(BaseModel):
+    registered: int
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    configure_observability()
+    load_snapshot()
+    prefetch(*CACHES, recent_menu_caches[DEFAULT_HOUSEHOLD])
+    prime_suggestion_pools()
+    yield
+
+
+app = FastAPI(title="おうちの主菜 API", lifespan=lifespan)
+
+
+def _route_path(request: Request) -> str:
+    """Path template of the route that handles ``request`` ("unmatched" when none does)."""
+    # ラベルにはリクエストのパスではなくルートのテンプレートを使い、メトリクスの系列数を有限にする
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    with span("api.request", method=request.method, path=_route_path(request)) as request_span:
+        response = await call_next(request)
+        request_span.set(status_code=response.status_code)
+    return response
+
+
+def _recent_menu(household: str) -> list[str]:
+    return fetch_recent_menu_list(household)[0][:RECENT_MENU_LIMIT]
+
+
+def _check_known_dishes(names: list[str]) -> None:
+    catalog = fetch_menu_catalog()
+    if unknown := [name for name in names if name not in catalog.ids]:
+        raise HTTPException(status_code=422, detail=f"Unknown dishes: {', '.join(unknown)}")
+
+
+@app.get("/suggest/today", response_model=DaySuggestion)
+def suggest_today(household: Household = DEFAULT_HOUSEHOLD) -> DaySuggestion:
+    # 提案する日と応答の日付を同じにする (日付の変わり目で食い違わないように)
+    today = today_in_japan()
+    try:
+        dish = daily_suggestion_pool.pop(fetch_menu_catalog(), _recent_menu(household), household, today)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    return DaySuggestion(date=today, dish=MenuResponse.from_menu(dish))
+
+
+@app.get("/suggest/week", response_model=WeekSuggestion)
+def suggest_week(household: Household = DEFAULT_HOUSEHOLD) -> WeekSuggestion:
+    today = today_in_japan()
+    try:
+        dishes = weekly_suggestion_pool.pop(fetch_menu_catalog(), _recent_menu(household), household, today)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+
+    return WeekSuggestion(
+        days=[DaySuggestion(date=today + timedelta(days=i), dish=MenuResponse.from_menu(dish)) for i, dish in enumerate(dishes)]
+    )
+
+
+@app.get("/suggest/weeks", response_model=list[WeekSuggestion])
+def suggest_weeks(n_weeks: int = Query(default=2, ge=1, le=MAX_WEEKS), household: Household = DEFAULT_HOUSEHOLD) -> list[WeekSuggestion]:
+    catalog = fetch_menu_catalog()
+    # 間隔(interval)の判定には直近の履歴より長い、カタログで最も長い間隔分の履歴が必要になる
+    history = fetch_interval_history(household)
+    today = today_in_japan()
+    try:
+        weeks = plan_weeks(catalog, history, n_weeks, start=today, preference=get_preference_weights(catalog, household))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+
+    return [
+        WeekSuggestion(
+            days=[
+                DaySuggestion(date=today + timedelta(weeks=week, days=day), dish=MenuResponse.from_menu(dish))
+                for day, dish in enumerate(dishes)
+            ]
+        )
+        for week, dishes in enumerate(weeks)
+    ]
+
+
+@app.post("/ingredients", response_model=IngredientsResponse)
+def ingredients(request: IngredientsRequest) -> IngredientsResponse:
+    _check_known_dishes(request.dishes)
+    index = fetch_ingredient_index()
+    shopping_list = aggregate_shopping_list(index, request.dishes)
+    return IngredientsResponse(
+        dishes=[DishIngredients(name=name, ingredients=index.lines_for(name)) for name in request.dishes],
+        totals=shopping_list.lines(),
+        unconverted=shopping_list.unconverted_ingredients(),
+    )
+
+
+@app.post("/history", response_model=HistoryResponse)
+def register_history(request: HistoryRequest, response: Response, household: Household = DEFAULT_HOUSEHOLD) -> HistoryResponse:
+    _check_known_dishes([entry.menu for entry in request.entries])
+    if not request.entries:
+        return HistoryResponse(registered=0)
+
+    df = pd.DataFrame({"date": [entry.date for entry in request.entries], "menu": [entry.menu for entry in request.entries]})
+    pending = register_dish_history(df, household)
+    apply_registered_history(df, household, pending)
+    if pending is not None:
+        # 書き込みキューに積んだだけで、まだ保存されていない
+        response.status_code = 202
+    prime_suggestion_pools(household)
+    return HistoryResponse(registered=len(df))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    return registry.render_prometheus()
+
+
+@app.get("/healthz")
+def healthz() -> dict[str, bool]:
+    return {cache.name: cache.is_fresh() for cache in CACHES}
+
+
+if __name__ == "__main__":
+    workers = int(os.environ.get("DISH_API_WORKERS", os.cpu_count() or 1))
+    uvicorn.run("api:app", host="0.0.0.0", port=int(os.environ.get("DISH_API_PORT", "8000")), workers=workers)
@@ -1,4 +1,12 @@
 import streamlit as st
+from lib.metrics import configure_observability, span
+from lib.repository import DEFAULT_HOUSEHOLD, is_valid_household
+from lib.snapshot import load_snapshot
+from lib.startup import first_render
+
+configure_observability()
+# DISH_SNAPSHOT_DIR があれば、最初の描画を BigQuery を待たずにスナップショットから行う (プロセスごとに1回)
+load_snapshot()
 
 st.set_page_config(
     page_title="おうちの主菜",
@@ -13,4 +21,17 @@ register_dishes = st.Page("register_dishes.py", title="主菜を登録")
 
 pg = st.navigation([weekly_dishes, daily_dishes, register_dishes])
 
-pg.run()
+# 世帯は URL の ?household= で指定する。ページを移動しても同じ世帯のままにするためセッションに保存する
+if "household" in st.query_params:
+    if is_valid_household(st.query_params["household"]):
+        st.session_state.household = st.query_params["household"]
+    else:
+        # API と同じ規則に合わない世帯 ID は使わず、それまでの世帯 (なければ既定の世帯) のままにする
+        st.warning("URL の household は英数字・_・- の 64 文字までで指定してください。")
+        st.session_state.setdefault("household", DEFAULT_HOUSEHOLD)
+elif "household" not in st.session_state:
+    st.session_state.household = DEFAULT_HOUSEHOLD
+
+# 再実行ごとの所要時間 (ページスクリプト全体)
+with span("page.rerun", page=pg.url_path or "weekly_dishes"), first_render():
+    pg.run()
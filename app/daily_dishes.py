@@ -1,22 +1,35 @@
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-import pandas as pd
 import streamlit as st
-from lib.cache import fetch_ingredients_data, fetch_menu_data, fetch_recent_menu_list
-from lib.recipe import get_todays_dish
-from lib.util import Menu, format_number
+from lib.cache import (
+    fetch_ingredient_index,
+    fetch_menu_catalog,
+    fetch_recent_menu_list,
+    ingredient_index_cache,
+    menu_catalog_cache,
+    prefetch,
+    recent_menu_caches,
+)
+from lib.catalog import MenuCatalog
+from lib.ingredients import IngredientIndex
+from lib.recipe import RECENT_MENU_LIMIT
+from lib.repository import DEFAULT_HOUSEHOLD, today_in_japan
+from lib.suggestion_pool import daily_suggestion_pool
 
 # Title and header
 st.title("今日の主菜")
 
 
+# 履歴・提案は世帯ごと (app.py が URL から設定する)
+household: str = st.session_state.get("household", DEFAULT_HOUSEHOLD)
+
 # Load data
-dishes: list[Menu] = fetch_menu_data()
-dish_list = [dish.name for dish in dishes]
+prefetch(menu_catalog_cache, ingredient_index_cache, recent_menu_caches[household])
+dishes: MenuCatalog = fetch_menu_catalog()
 
-df_ingredients: pd.DataFrame = fetch_ingredients_data()
-recent_menu: list[str] = fetch_recent_menu_list()[0][:7]
+ingredient_index: IngredientIndex = fetch_ingredient_index()
+recent_menu: list[str] = fetch_recent_menu_list(household)[0][:RECENT_MENU_LIMIT]
 
 # Get today's date in Japan time
 today = datetime.now(ZoneInfo("Asia/Tokyo")).strftime("%m/%d(%a)")
@@ -25,20 +38,20 @@ today = datetime.now(ZoneInfo("Asia/Tokyo")).strftime("%m/%d(%a)")
 if "selected_dish" not in st.session_state:
     st.session_state.selected_dish = ""
 
-# Suggest dish button
+# Suggest dish button (提案はバックグラウンドで用意しておいたものを取り出す)
+suggest_day = today_in_japan()
+daily_suggestion_pool.prime(dishes, recent_menu, household, suggest_day)
 if st.button("主菜を提案"):
-    st.session_state.selected_dish = get_todays_dish(dishes, recent_menu).name
+    st.session_state.selected_dish = daily_suggestion_pool.pop(dishes, recent_menu, household, suggest_day).name
 
 # User input for today's dish
 st.session_state.selected_dish = st.selectbox(
     f"{today}: 主菜を選択",
-    options=[""] + dish_list,
-    index=(dish_list.index(st.session_state.selected_dish) + 1 if st.session_state.selected_dish else 0),
+    options=dishes.options,
+    index=dishes.option_index(st.session_state.selected_dish),
 )
 
 # Display ingredients if a dish is selected
 selected_dish = st.session_state.selected_dish
 if selected_dish:
-    df_target = df_ingredients[df_ingredients["menu"] == selected_dish]
-    ingredients = [f"{row['ingredients']} {format_number(row['number'])}{row['units']}" for _, row in df_target.iterrows()]
-    st.text("\n".join(ingredients))
+    st.text(ingredient_index.text_for(selected_dish))
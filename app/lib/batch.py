@@ -0,0 +1,109 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+
+from lib.catalog import MenuCatalog
+from lib.recipe import get_day_weights
+from lib.repository import today_in_japan
+from lib.solver import DEFAULT_WEEKLY_CONSTRAINTS, WeeklyConstraints
+from lib.util import Menu
+
+# 1チャンクあたりの (献立数 × メニュー数) の上限
+MAX_CHUNK_CELLS = 2_000_000
+
+
+@dataclass(frozen=True)
+class PlanBatch:
+    """Top plans of a batch. ``plans`` holds menu positions, shape (k, n_days)."""
+
+    plans: np.ndarray
+    scores: np.ndarray
+    n_generated: int
+    n_valid: int
+
+    def to_menus(self, catalog: MenuCatalog) -> list[list[Menu]]:
+        return [[catalog[int(i)] for i in plan] for plan in self.plans]
+
+
+def _count_distinct(codes: np.ndarray) -> np.ndarray:
+    codes = np.sort(codes, axis=1)
+    return (np.diff(codes, axis=1) != 0).sum(axis=1) + 1
+
+
+def _sample_chunk(
+    catalog: MenuCatalog,
+    log_weights: np.ndarray,
+    ingredient_caps: np.ndarray,
+    category_caps: np.ndarray,
+    n: int,
+    rng: np.random.Generator,
+) -> tuple[np.ndarray, np.ndarray]:
+    n_days, n_menus = log_weights.shape
+    rows = np.arange(n)
+    used = np.zeros((n, n_menus), dtype=bool)
+    ingredient_counts = np.zeros((n, len(ingredient_caps)), dtype=np.int64)
+    category_counts = np.zeros((n, len(category_caps)), dtype=np.int64)
+    plans = np.zeros((n, n_days), dtype=np.intp)
+    valid = np.ones(n, dtype=bool)
+
+    for day in range(n_days):
+        # 既に選んだメニューと上限に達した食材・カテゴリを除外してから Gumbel-max で重み付き抽選する
+        eligible = ~used
+        eligible &= (ingredient_counts < ingredient_caps)[:, catalog.ingredient_codes]
+        eligible &= (category_counts < category_caps)[:, catalog.category_codes]
+        keys = np.where(eligible, log_weights[day] + rng.gumbel(size=(n, n_menus)), -np.inf)
+        picks = keys.argmax(axis=1)
+        valid &= np.isfinite(keys[rows, picks])
+
+        plans[:, day] = picks
+        used[rows, picks] = True
+        ingredient_counts[rows, catalog.ingredient_codes[picks]] += 1
+        category_counts[rows, catalog.category_codes[picks]] += 1
+
+    return plans, valid
+
+
+def generate_weekly_plans(
+    catalog: MenuCatalog,
+    recent_menu: Sequence[str],
+    n: int,
+    top_k: int | None = None,
+    rng: np.random.Generator | None = None,
+    constraints: WeeklyConstraints = DEFAULT_WEEKLY_CONSTRAINTS,
+    start: date | None = None,
+) -> PlanBatch:
+    """Sample ``n`` weekly plans at once and return the ``top_k`` most diverse valid ones.
+
+    Each day is drawn for all plans together; menus that are already used or whose ingredient /
+    category cap is reached are masked out before drawing, so sampled plans never break a cap.
+    Plans that run out of candidates on some day are rejected. The diversity score is the number
+    of distinct main ingredients + cooking methods + categories in the plan. ``start`` defaults to
+    today in Japan.
+    """
+    rng = rng or np.random.default_rng()
+    start = start or today_in_japan()
+    with np.errstate(divide="ignore"):
+        log_weights = np.log(get_day_weights(catalog, recent_menu, start, constraints))
+    ingredient_caps = catalog.ingredient_caps(constraints.ingredient_caps)
+    category_caps = catalog.category_caps(constraints.category_caps)
+
+    chunk_size = max(1, MAX_CHUNK_CELLS // max(1, len(catalog)))
+    chunks = [
+        _sample_chunk(catalog, log_weights, ingredient_caps, category_caps, min(chunk_size, n - offset), rng)
+        for offset in range(0, n, chunk_size)
+    ]
+    plans = np.concatenate([plans for plans, _ in chunks]) if chunks else np.zeros((0, constraints.n_days), dtype=np.intp)
+    valid = np.concatenate([valid for _, valid in chunks]) if chunks else np.zeros(0, dtype=bool)
+    plans = plans[valid]
+
+    scores = (
+        _count_distinct(catalog.ingredient_codes[plans])
+        + _count_distinct(catalog.cooking_method_codes[plans])
+        + _count_distinct(catalog.category_codes[plans])
+    )
+
+    k = len(plans) if top_k is None else min(top_k, len(plans))
+    top = np.argsort(-scores, kind="stable")[:k]
+    return PlanBatch(plans=plans[top], scores=scores[top], n_generated=n, n_valid=len(plans))
@@ -1,23 +1,410 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from datetime import date, timedelta
+from typing import Generic, TypeVar
+
 import pandas as pd
-import streamlit as st
 
-from lib.recipe import get_ingredients_data, get_menu_data, get_recent_menu
+from lib.catalog import MenuCatalog
+from lib.ingredients import IngredientIndex
+from lib.metrics import LabelKey, inc, registry, span
+from lib.recipe import get_history_since, get_ingredient_index, get_menu_catalog, get_recent_menu
+from lib.repository import DEFAULT_HOUSEHOLD, HISTORY_DAYS, get_repository, history_versions, today_in_japan
 from lib.util import Menu
 
+T = TypeVar("T")
+
+# データセットごとの鮮度確認の間隔(秒)。この間はリポジトリに問い合わせずキャッシュを返す
+CACHE_TTLS = {
+    "main_dish": 600.0,
+    "ingredients": 600.0,
+    "dish_history": 60.0,
+}
+# 差分取得 (DISH_HISTORY_INCREMENTAL=1) で、最後に読み込んだ日付から遡って読み直す日数
+HISTORY_OVERLAP_DAYS = 3
+# 差分取得でも、この間隔(秒)ごとに期間全体を読み直す (他のワーカーが古い日付に登録した行を取り込むため)
+HISTORY_FULL_RELOAD_INTERVAL = float(os.environ.get("DISH_HISTORY_FULL_RELOAD_INTERVAL", "3600"))
+# 直近の履歴をキャッシュしておく世帯数の上限。超えると最も長く使われていない世帯のキャッシュを捨てる
+MAX_CACHED_HOUSEHOLDS = int(os.environ.get("DISH_MAX_CACHED_HOUSEHOLDS", "256"))
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    revalidations: int = 0
+    # 他のセッションが実行中の読み込みを共有した回数
+    shared: int = 0
+
+
+@dataclass
+class _Entry(Generic[T]):
+    value: T
+    version: Hashable
+    checked_at: float
+    # 最後に loader で全体を読み込んだ時刻 (refresher での更新では変わらない)
+    loaded_at: float
+
+
+class DatasetCache(Generic[T]):
+    """Process-wide cache of one dataset with a TTL and a cheap freshness check.
+
+    Within ``ttl`` seconds of the last check the cached value is returned as is. After that,
+    ``version()`` (e.g. the table's last-modified time) is compared with the version the value
+    was loaded at, and the dataset is reloaded only if it changed. With a ``refresher``, a changed
+    dataset is brought up to date from the cached value (e.g. by fetching only new rows) instead,
+    except that a change found ``full_reload_interval`` seconds or more after the last full load
+    reloads it in full, so changes the refresher cannot see are picked up eventually.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], T],
+        version: Callable[[], Hashable],
+        ttl: float,
+        refresher: Callable[[T], T] | None = None,
+        full_reload_interval: float = float("inf"),
+    ):
+        self.name = name
+        self.loader = loader
+        self.version = version
+        self.ttl = ttl
+        self.refresher = refresher
+        self.full_reload_interval = full_reload_interval
+        self.stats = CacheStats()
+        self._entry: _Entry[T] | None = None
+        self._lock = threading.Lock()
+        self._inflight: Future[T] | None = None
+
+    def is_fresh(self) -> bool:
+        entry = self._entry
+        return entry is not None and time.monotonic() - entry.checked_at < self.ttl
+
+    def get(self) -> T:
+        return self._get(force=False)
+
+    def revalidate(self) -> T:
+        """Check the version now regardless of the TTL, reloading the dataset if it changed."""
+        return self._get(force=True)
+
+    def _get(self, force: bool) -> T:
+        with self._lock:
+            entry = self._entry
+            if not force and entry is not None and time.monotonic() - entry.checked_at < self.ttl:
+                self.stats.hits += 1
+                inc("cache_requests_total", dataset=self.name, result="hit")
+                return entry.value
+
+            # 同じデータセットの読み込み中は、新たに問い合わせずその結果を待つ
+            inflight = self._inflight
+            if inflight is not None:
+                self.stats.shared += 1
+                inc("cache_requests_total", dataset=self.name, result="shared")
+            else:
+                future: Future[T] = Future()
+                self._inflight = future
+
+        if inflight is not None:
+            return inflight.result()
+
+        try:
+            value = self._revalidate(entry)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight = None
+
+    def _revalidate(self, entry: "_Entry[T] | None") -> T:
+        now = time.monotonic()
+        with span("cache.version", dataset=self.name):
+            version = self.version()
+        if entry is not None and version == entry.version:
+            with self._lock:
+                self.stats.revalidations += 1
+                entry.checked_at = now
+            inc("cache_requests_total", dataset=self.name, result="revalidated")
+            return entry.value
+
+        result = "miss" if entry is None else "refresh"
+        refresher = self.refresher if entry is not None and now - entry.loaded_at < self.full_reload_interval else None
+        with span("cache.load", dataset=self.name, result=result, incremental=refresher is not None):
+            if entry is not None and refresher is not None:
+                value, loaded_at = refresher(entry.value), entry.loaded_at
+            else:
+                value, loaded_at = self.loader(), now
+        with self._lock:
+            if entry is None:
+                self.stats.misses += 1
+            else:
+                self.stats.refreshes += 1
+            self._entry = _Entry(value, version, now, loaded_at)
+        inc("cache_requests_total", dataset=self.name, result=result)
+        return value
+
+    def seed(self, value: T, version: Hashable) -> None:
+        """Install a value loaded elsewhere (e.g. from a snapshot) if nothing is cached yet."""
+        with self._lock:
+            if self._entry is None:
+                now = time.monotonic()
+                self._entry = _Entry(value, version, now, now)
+
+    def update(self, function: Callable[[T], T], version: Hashable | None = None) -> None:
+        """Apply ``function`` to the cached value (write-through).
+
+        ``version`` is the dataset's version produced by the write, at which the value is marked as
+        current; without it the value keeps the version it was loaded at.
+        """
+        with self._lock:
+            entry = self._entry
+            if entry is not None:
+                checked_at = entry.checked_at if version is None else time.monotonic()
+                self._entry = _Entry(function(entry.value), entry.version if version is None else version, checked_at, entry.loaded_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entry = None
+
+
+class HouseholdCaches(Generic[T]):
+    """One DatasetCache per household, created on first use.
+
+    At most ``max_households`` caches are kept, in least-recently-used order: adding a household
+    beyond that drops the cache of the household used longest ago (it is loaded again if that
+    household comes back), so memory stays flat however many households use the process.
+    """
+
+    def __init__(self, name: str, factory: Callable[[str], DatasetCache[T]], max_households: int = MAX_CACHED_HOUSEHOLDS):
+        self.name = name
+        self.factory = factory
+        self.max_households = max_households
+        self.evictions = 0
+        # 捨てたキャッシュの stats。エクスポートするカウンタが減らないように合計に含める
+        self._evicted_stats = CacheStats()
+        self._caches: OrderedDict[str, DatasetCache[T]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, household: str) -> DatasetCache[T]:
+        with self._lock:
+            cache = self._caches.get(household)
+            if cache is not None:
+                self._caches.move_to_end(household)
+                return cache
+
+            cache = self._caches[household] = self.factory(household)
+            if len(self._caches) > self.max_households:
+                _, evicted = self._caches.popitem(last=False)
+                self._retire(evicted)
+                self.evictions += 1
+                inc("cache_household_evictions_total", dataset=self.name)
+            return cache
+
+    def __len__(self) -> int:
+        return len(self._caches)
+
+    def __contains__(self, household: object) -> bool:
+        return household in self._caches
+
+    def _retire(self, cache: DatasetCache[T]) -> None:
+        for field in fields(CacheStats):
+            setattr(self._evicted_stats, field.name, getattr(self._evicted_stats, field.name) + getattr(cache.stats, field.name))
+
+    @property
+    def stats(self) -> CacheStats:
+        """Cumulative stats over every household cache, including evicted ones."""
+        with self._lock:
+            totals = [self._evicted_stats, *(cache.stats for cache in self._caches.values())]
+            return CacheStats(**{field.name: sum(getattr(stats, field.name) for stats in totals) for field in fields(CacheStats)})
+
+    def clear(self) -> None:
+        with self._lock:
+            for cache in self._caches.values():
+                self._retire(cache)
+            self._caches.clear()
+
+
+def _table_version(table: str) -> Callable[[], Hashable]:
+    return lambda: get_repository().get_table_version(table)
+
+
+menu_catalog_cache: DatasetCache[MenuCatalog] = DatasetCache(
+    "main_dish", get_menu_catalog, _table_version("main_dish"), CACHE_TTLS["main_dish"]
+)
+ingredient_index_cache: DatasetCache[IngredientIndex] = DatasetCache(
+    "ingredients", get_ingredient_index, _table_version("ingredients"), CACHE_TTLS["ingredients"]
+)
+
+
+def _history_window(history: dict[date, str], days: int = HISTORY_DAYS) -> tuple[list[str], list[date]]:
+    """Newest-first (menus, dates) of ``history`` within the last ``days`` days."""
+    since = today_in_japan() - timedelta(days=days)
+    dates = sorted((day for day in history if day >= since), reverse=True)
+    return [history[day] for day in dates], dates
+
+
+def _fetch_new_history(
+    recent: tuple[list[str], list[date]], household: str = DEFAULT_HOUSEHOLD, days: int = HISTORY_DAYS
+) -> tuple[list[str], list[date]]:
+    """Bring the cached history up to date by reading only the days from the last cached date on."""
+    menus, dates = recent
+    if not dates:
+        return get_recent_menu(days, household)
+
+    # 登録ページで直近の日付が書き換えられることがあるため、少し遡って読み直す
+    since = dates[0] - timedelta(days=HISTORY_OVERLAP_DAYS)
+    new_menus, new_dates = get_history_since(since, household)
+    history = {day: menu for day, menu in zip(dates, menus, strict=True) if day < since}
+    return _history_window(history | dict(zip(new_dates, new_menus, strict=True)), days)
+
+
+def history_incremental_enabled() -> bool:
+    return os.environ.get("DISH_HISTORY_INCREMENTAL", "") == "1"
+
+
+def _interval_history_days() -> int:
+    """Days of history needed to check every dish's interval (the longest interval in the catalog)."""
+    return int(fetch_menu_catalog().intervals.max(initial=0))
+
+
+def _history_cache(name: str, household: str, days: Callable[[], int]) -> DatasetCache[tuple[list[str], list[date]]]:
+    refresher = (lambda recent: _fetch_new_history(recent, household, days())) if history_incremental_enabled() else None
+    return DatasetCache(
+        name,
+        lambda: get_recent_menu(days(), household),
+        # このプロセスでの他の世帯の登録では変わらない版 (テーブルのメタデータのみで確認する)
+        lambda: history_versions.version(household),
+        CACHE_TTLS["dish_history"],
+        refresher=refresher,
+        full_reload_interval=HISTORY_FULL_RELOAD_INTERVAL,
+    )
+
+
+def _recent_menu_cache(household: str) -> DatasetCache[tuple[list[str], list[date]]]:
+    return _history_cache("dish_history", household, lambda: HISTORY_DAYS)
+
+
+def _interval_history_cache(household: str) -> DatasetCache[tuple[list[str], list[date]]]:
+    return _history_cache("dish_history_intervals", household, _interval_history_days)
+
+
+recent_menu_caches: HouseholdCaches[tuple[list[str], list[date]]] = HouseholdCaches("dish_history", _recent_menu_cache)
+# 複数週の計画 (lib.planner) 用の、カタログで最も長い間隔分の履歴
+interval_history_caches: HouseholdCaches[tuple[list[str], list[date]]] = HouseholdCaches("dish_history_intervals", _interval_history_cache)
+# 世帯ごとの履歴のキャッシュと、それぞれが保持する日数
+HISTORY_CACHES: list[tuple[HouseholdCaches[tuple[list[str], list[date]]], Callable[[], int]]] = [
+    (recent_menu_caches, lambda: HISTORY_DAYS),
+    (interval_history_caches, _interval_history_days),
+]
+# 全世帯で共有するカタログのキャッシュ
+CACHES: list[DatasetCache] = [menu_catalog_cache, ingredient_index_cache]
+
+# カタログ 2 つと世帯の履歴を並行して読み込む
+_loader_executor = ThreadPoolExecutor(max_workers=len(CACHES) + 1, thread_name_prefix="dataset-loader")
+
+
+def prefetch(*caches: DatasetCache) -> None:
+    """Load the given datasets in parallel, so a cold page waits only for the slowest query.
+
+    Datasets that are still fresh are skipped; the page then reads them with the fetch_* functions.
+    """
+    stale = [cache for cache in caches if not cache.is_fresh()]
+    if len(stale) == 1:
+        stale[0].get()
+    elif stale:
+        for future in [_loader_executor.submit(cache.get) for cache in stale]:
+            future.result()
+
+
+def revalidate_in_background(*caches: DatasetCache) -> list[Future]:
+    """Check the given datasets for changes on the loader threads without blocking the caller."""
+    return [_loader_executor.submit(cache.revalidate) for cache in caches]
+
+
+def fetch_menu_catalog() -> MenuCatalog:
+    """Fetch the menu catalog, reloading it when main_dish has changed."""
+    return menu_catalog_cache.get()
+
 
-@st.cache_data
 def fetch_menu_data() -> list[Menu]:
-    """Fetch menu data once per session."""
-    return get_menu_data()
+    return list(fetch_menu_catalog())
+
+
+def fetch_ingredient_index() -> IngredientIndex:
+    """Fetch the per-dish ingredient index, rebuilding it when ingredients has changed."""
+    return ingredient_index_cache.get()
+
+
+def fetch_recent_menu_list(household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+    """Fetch the household's recent menu data, reloading it when the household's rows in dish_history have changed."""
+    menu_list, date_list = recent_menu_caches[household].get()
+    return list(menu_list), list(date_list)
+
+
+def fetch_interval_history(household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+    """Fetch the household's history over the longest dish interval (for lib.planner), reloading it when its rows have changed."""
+    menu_list, date_list = interval_history_caches[household].get()
+    return list(menu_list), list(date_list)
+
+
+def apply_registered_history(df: pd.DataFrame, household: str = DEFAULT_HOUSEHOLD, pending: Future[None] | None = None) -> None:
+    """Merge newly registered (date, menu) rows into the household's cached histories instead of re-querying them.
+
+    The caches are marked as current at the version the write produced, so they are not reloaded for
+    it. ``pending`` is the write-behind Future returned by register_dish_history: the rows are merged
+    right away and the version is recorded once the write has landed, or, if it fails for good, the
+    household's caches are dropped so the rows that were never stored do not linger in them.
+    """
+    registered = {pd.Timestamp(day).date(): menu for day, menu in zip(df["date"], df["menu"], strict=True)}
+
+    def merge(window: int) -> Callable[[tuple[list[str], list[date]]], tuple[list[str], list[date]]]:
+        return lambda recent: _history_window(dict(zip(recent[1], recent[0], strict=True)) | registered, window)
+
+    caches = [(household_caches[household], days) for household_caches, days in HISTORY_CACHES if household in household_caches]
+
+    def write_through(version: Hashable | None) -> None:
+        for cache, days in caches:
+            cache.update(merge(days()), version)
+
+    if pending is None:
+        write_through(history_versions.current(household))
+        return
+
+    def on_written(future: Future[None]) -> None:
+        if future.exception() is not None:
+            for cache, _ in caches:
+                cache.clear()
+        else:
+            # 書き込み後の版で最新とする (書き込みの前に読み直されていても、書き込んだ行をもう一度反映する)
+            write_through(history_versions.current(household))
+
+    write_through(None)
+    pending.add_done_callback(on_written)
+
+
+def get_cache_stats() -> dict[str, CacheStats]:
+    return {cache.name: cache.stats for cache in CACHES} | {caches.name: caches.stats for caches, _ in HISTORY_CACHES}
 
 
-@st.cache_data
-def fetch_ingredients_data() -> pd.DataFrame:
-    """Fetch ingredients data once per session."""
-    return get_ingredients_data()
+def _cache_gauges() -> dict[tuple[str, LabelKey], float]:
+    gauges: dict[tuple[str, LabelKey], float] = {}
+    for cache in CACHES:
+        gauges["cache_fresh", (("dataset", cache.name),)] = float(cache.is_fresh())
+    for name, stats in get_cache_stats().items():
+        for field, value in vars(stats).items():
+            gauges[f"cache_{field}", (("dataset", name),)] = float(value)
+    for caches, _ in HISTORY_CACHES:
+        gauges["cache_households", (("dataset", caches.name),)] = float(len(caches))
+    return gauges
 
 
-@st.cache_data
-def fetch_recent_menu_list() -> tuple[list[str], list[str]]:
-    """Fetch recent menu data once per session."""
-    return get_recent_menu()
+registry.add_collector(_cache_gauges)
@@ -0,0 +1,208 @@
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from typing import overload
+
+import numpy as np
+import pyarrow as pa
+
+from lib.util import Menu
+
+UNLIMITED = 1 << 30
+
+# 夏・冬メニューを出す月
+SUMMER_MONTHS = (6, 7, 8, 9)
+WINTER_MONTHS = (11, 12, 1, 2, 3)
+
+
+def _encode(values: Iterable) -> tuple[np.ndarray, list]:
+    codes: dict = {}
+    return np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.intp), list(codes)
+
+
+def _column_codes(column: pa.ChunkedArray) -> tuple[np.ndarray, list]:
+    """Codes and distinct values of a string column; a dictionary-encoded column is used without copying its indices."""
+    if pa.types.is_dictionary(column.type) and column.num_chunks == 1:
+        chunk = column.chunk(0)
+        # null も辞書の値として符号化されている場合だけ (menus_to_table の null_encoding="encode")
+        if chunk.indices.null_count == 0:
+            return chunk.indices.to_numpy(), chunk.dictionary.to_pylist()
+    return _encode(column.to_pylist())
+
+
+class MenuCatalog(Sequence[Menu]):
+    """Menu list stored as struct-of-arrays.
+
+    Season, cooking method, main ingredient and category are integer-coded, and the month ×
+    season and holiday filters are precomputed as boolean masks, so filtering is a mask AND.
+    Indexing returns ``Menu`` views (built on first access), so the catalog can be used wherever
+    a ``list[Menu]`` was expected.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        seasons: Sequence[str],
+        holiday_only: Sequence[bool],
+        not_storable: Sequence[bool],
+        intervals: Sequence[int],
+        cooking_methods: Sequence[str],
+        main_ingredients: Sequence[str],
+        categories: Sequence[str | None],
+    ):
+        self._build(
+            list(names),
+            _encode(seasons),
+            np.array(holiday_only, dtype=bool),
+            np.array(not_storable, dtype=bool),
+            np.array(intervals, dtype=np.int64),
+            _encode(cooking_methods),
+            _encode(main_ingredients),
+            _encode(categories),
+        )
+
+    def _build(
+        self,
+        names: list[str],
+        seasons: tuple[np.ndarray, list],
+        holiday_only: np.ndarray,
+        not_storable: np.ndarray,
+        intervals: np.ndarray,
+        cooking_methods: tuple[np.ndarray, list],
+        main_ingredients: tuple[np.ndarray, list],
+        categories: tuple[np.ndarray, list],
+    ) -> None:
+        self.names: list[str] = names
+        self.ids: dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.season_codes, self.season_names = seasons
+        self.cooking_method_codes, self.cooking_method_names = cooking_methods
+        self.ingredient_codes, self.ingredient_names = main_ingredients
+        self.category_codes, self.category_names = categories
+        # 配列はコピーせずに使う (from_table ではメモリマップしたファイルのバッファのことがある)
+        self.holiday_only = np.asarray(holiday_only, dtype=bool).reshape(-1)
+        self.not_storable = np.asarray(not_storable, dtype=bool).reshape(-1)
+        self.intervals = np.asarray(intervals, dtype=np.int64).reshape(-1)
+        self._views: list[Menu | None] = [None] * len(self.names)
+        self._all_views: list[Menu] | None = None
+        self._options: list[str] | None = None
+
+        # month_masks[month]: その月に出せるメニュー (0 は未使用)
+        season_of_menu = np.array(self.season_names, dtype=object)[self.season_codes]
+        summer, winter = season_of_menu == "夏", season_of_menu == "冬"
+        self.month_masks = np.ones((13, len(self.names)), dtype=bool)
+        for month in range(1, 13):
+            if month not in SUMMER_MONTHS:
+                self.month_masks[month] &= ~summer
+            if month not in WINTER_MONTHS:
+                self.month_masks[month] &= ~winter
+        # holiday_masks[is_weekend]: 平日・休日に出せるメニュー
+        self.holiday_masks = np.stack([~self.holiday_only, np.ones(len(self.names), dtype=bool)])
+
+    @classmethod
+    def from_menus(cls, menus: Iterable[Menu]) -> "MenuCatalog":
+        menus = list(menus)
+        return cls(
+            names=[menu.name for menu in menus],
+            seasons=[menu.season for menu in menus],
+            holiday_only=[menu.holiday_only for menu in menus],
+            not_storable=[menu.not_storable for menu in menus],
+            intervals=[menu.interval for menu in menus],
+            cooking_methods=[menu.cooking_method for menu in menus],
+            main_ingredients=[menu.main_ingredient for menu in menus],
+            categories=[menu.category for menu in menus],
+        )
+
+    @classmethod
+    def from_table(cls, table: pa.Table) -> "MenuCatalog":
+        """Build the catalog from an Arrow table with one column per Menu field (lib.table_store), without Menu objects.
+
+        Dictionary-encoded string columns (as menus_to_table writes them) give the codes as a view of
+        their index buffer, and the interval column is used in place, so for a memory-mapped table
+        those arrays are pages of the file shared with other processes. Menu names (with the
+        name-to-position dict) and the bit-packed flag columns are copied into each process.
+        """
+        catalog = cls.__new__(cls)
+        catalog._build(
+            table.column("name").to_pylist(),
+            _column_codes(table.column("season")),
+            table.column("holiday_only").to_numpy(),
+            table.column("not_storable").to_numpy(),
+            table.column("interval").combine_chunks().to_numpy(zero_copy_only=False),
+            _column_codes(table.column("cooking_method")),
+            _column_codes(table.column("main_ingredient")),
+            _column_codes(table.column("category")),
+        )
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @overload
+    def __getitem__(self, index: int) -> Menu: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Menu]: ...
+
+    def __getitem__(self, index: int | slice) -> Menu | list[Menu]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        view = self._views[index]
+        if view is None:
+            i = range(len(self))[index]
+            view = Menu(
+                name=self.names[i],
+                season=self.season_names[self.season_codes[i]],
+                holiday_only=bool(self.holiday_only[i]),
+                not_storable=bool(self.not_storable[i]),
+                interval=int(self.intervals[i]),
+                cooking_method=self.cooking_method_names[self.cooking_method_codes[i]],
+                main_ingredient=self.ingredient_names[self.ingredient_codes[i]],
+                category=self.category_names[self.category_codes[i]],
+            )
+            self._views[index] = view
+        return view
+
+    def __iter__(self) -> Iterator[Menu]:
+        return (self[i] for i in range(len(self)))
+
+    def __contains__(self, menu: object) -> bool:
+        return isinstance(menu, Menu) and menu.name in self.ids and self[self.ids[menu.name]] == menu
+
+    def season_mask(self, month: int) -> np.ndarray:
+        return self.month_masks[month]
+
+    def holiday_mask(self, is_weekend: bool) -> np.ndarray:
+        return self.holiday_masks[int(is_weekend)]
+
+    def names_mask(self, names: Iterable[str]) -> np.ndarray:
+        """Mask of the menus whose name is in ``names`` (unknown names are ignored)."""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[[self.ids[name] for name in names if name in self.ids]] = True
+        return mask
+
+    @property
+    def options(self) -> list[str]:
+        """Selectbox options: a blank entry (no dish selected) followed by every menu name, built once per catalog."""
+        if self._options is None:
+            self._options = ["", *self.names]
+        return self._options
+
+    def option_index(self, name: str) -> int:
+        """Position of ``name`` in ``options`` (0, the blank entry, for "" or an unknown name)."""
+        return self.ids.get(name, -1) + 1
+
+    def select(self, mask: np.ndarray) -> list[Menu]:
+        if self._all_views is None:
+            self._all_views = list(self)
+        views = self._all_views
+        return [views[i] for i in np.flatnonzero(mask).tolist()]
+
+    def ingredient_caps(self, caps: Mapping[str, int]) -> np.ndarray:
+        """Cap per ingredient code (UNLIMITED when not capped)."""
+        return np.array([caps.get(name, UNLIMITED) for name in self.ingredient_names], dtype=np.int64)
+
+    def category_caps(self, caps: Mapping[str, int]) -> np.ndarray:
+        """Cap per category code (UNLIMITED when not capped or None)."""
+        return np.array([caps.get(name, UNLIMITED) if name is not None else UNLIMITED for name in self.category_names], dtype=np.int64)
+
+
+def as_catalog(dishes: Sequence[Menu]) -> MenuCatalog:
+    return dishes if isinstance(dishes, MenuCatalog) else MenuCatalog.from_menus(dishes)
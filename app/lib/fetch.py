@@ -0,0 +1,60 @@
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from lib.metrics import inc, span
+from lib.util import get_bigquery_client, get_bqstorage_client
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+    from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FetchStats:
+    rows: int
+    bytes_transferred: int
+    bytes_processed: int | None
+    storage_api: bool
+
+
+def fetch_arrow(query: str, job_config: "bigquery.QueryJobConfig | None" = None, table: str = "query") -> "tuple[pa.Table, FetchStats]":
+    """Run ``query`` and read its result once as an Arrow table.
+
+    The BigQuery Storage read API is used when google-cloud-bigquery-storage is installed;
+    otherwise the REST pages are decoded straight into Arrow record batches.
+    ``table`` labels the query in tracing spans and metrics.
+    """
+    with span("bigquery.query", table=table) as query_span:
+        client = get_bigquery_client()
+        query_job = client.query(query, job_config=job_config)
+        bqstorage_client = get_bqstorage_client()
+        result = query_job.result().to_arrow(bqstorage_client=bqstorage_client, create_bqstorage_client=False)
+
+        stats = FetchStats(
+            rows=result.num_rows,
+            bytes_transferred=result.nbytes,
+            bytes_processed=query_job.total_bytes_processed,
+            storage_api=bqstorage_client is not None,
+        )
+        query_span.set(
+            job_id=query_job.job_id,
+            rows=stats.rows,
+            bytes_transferred=stats.bytes_transferred,
+            bytes_processed=stats.bytes_processed,
+            bytes_billed=query_job.total_bytes_billed,
+            storage_api=stats.storage_api,
+        )
+    inc("bigquery_rows_total", stats.rows, table=table)
+    inc("bigquery_bytes_processed_total", stats.bytes_processed or 0, table=table)
+    inc("bigquery_bytes_billed_total", query_job.total_bytes_billed or 0, table=table)
+    logger.info("Fetched %d rows (%d bytes, storage_api=%s)", stats.rows, stats.bytes_transferred, stats.storage_api)
+    return result, stats
+
+
+def fetch_columns(query: str, job_config: "bigquery.QueryJobConfig | None" = None, table: str = "query") -> dict[str, list]:
+    """Run ``query`` and return its result as ``{column name: values}``."""
+    result, _ = fetch_arrow(query, job_config, table)
+    return {name: result.column(name).to_pylist() for name in result.column_names}
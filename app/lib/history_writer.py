@@ -0,0 +1,159 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+import pandas as pd
+
+from lib.metrics import inc, span
+from lib.repository import HISTORY_COLUMNS, history_versions, with_household
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0
+# 書き込みに失敗したバッチを試す回数 (次の flush_interval ごとに再試行する)
+WRITE_ATTEMPTS = 3
+
+_queue: "HistoryWriteQueue | None" = None
+_queue_lock = threading.Lock()
+
+
+@dataclass
+class WriteStats:
+    submissions: int = 0
+    flushes: int = 0
+    rows_written: int = 0
+    retries: int = 0
+    # WRITE_ATTEMPTS 回失敗して捨てた投稿の数
+    failures: int = 0
+    last_flush_seconds: float = 0.0
+    total_flush_seconds: float = 0.0
+
+
+@dataclass
+class _Submission:
+    df: pd.DataFrame
+    future: Future[None]
+    attempts: int = 0
+
+
+class HistoryWriteQueue:
+    """Write-behind queue for dish_history.
+
+    Submissions from all sessions and households are collected by a background thread and written
+    every ``flush_interval`` seconds as a single upsert (for the same household and date, the latest
+    submission wins).
+    ``submit`` returns a Future that completes when the batch containing it has been written. A
+    batch that fails is retried on the next flush, up to ``attempts`` times in all, after which its
+    futures fail with the error. ``close`` writes whatever is still queued before returning.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, attempts: int = WRITE_ATTEMPTS):
+        self.flush_interval = flush_interval
+        self.attempts = attempts
+        self.stats = WriteStats()
+        self._pending: list[_Submission] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, df: pd.DataFrame) -> Future[None]:
+        future: Future[None] = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("HistoryWriteQueue is closed")
+            self._pending.append(_Submission(with_household(df)[HISTORY_COLUMNS], future))
+            self.stats.submissions += 1
+            self._condition.notify()
+        return future
+
+    def flush(self) -> None:
+        """Write everything submitted so far from the calling thread."""
+        with self._condition:
+            batch, self._pending = self._pending, []
+        self._write(batch)
+
+    def close(self) -> None:
+        """Stop accepting submissions and wait until everything queued has been written (or has failed)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed and not self._pending:
+                    return
+            # 最初の投稿から flush_interval 待ち、その間の投稿をまとめて書き込む (close されたらすぐに書き込む)
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed, timeout=self.flush_interval)
+            self.flush()
+
+    def _write(self, batch: list[_Submission]) -> None:
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            with span("history.flush") as flush_span:
+                df = pd.concat([submission.df for submission in batch], ignore_index=True)
+                flush_span.set(submissions=len(batch), rows=len(df))
+                history_versions.register(df)
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        elapsed = time.perf_counter() - start
+        with self._condition:
+            self.stats.flushes += 1
+            self.stats.rows_written += len(df)
+            self.stats.last_flush_seconds = elapsed
+            self.stats.total_flush_seconds += elapsed
+        logger.info("Wrote %d history submissions (%d rows) in %.3fs", len(batch), len(df), elapsed)
+        for submission in batch:
+            submission.future.set_result(None)
+
+    def _fail(self, batch: list[_Submission], error: Exception) -> None:
+        for submission in batch:
+            submission.attempts += 1
+        retry = [submission for submission in batch if submission.attempts < self.attempts]
+        failed = [submission for submission in batch if submission.attempts >= self.attempts]
+        logger.exception("Failed to write %d history submissions (%d will be retried)", len(batch), len(retry))
+
+        with self._condition:
+            # 後から投稿された同じ日付を上書きしないよう、再試行分はキューの先頭に戻す
+            self._pending[:0] = retry
+            self.stats.retries += len(retry)
+            self.stats.failures += len(failed)
+            self._condition.notify()
+        if failed:
+            inc("history_write_failures_total", len(failed))
+        for submission in failed:
+            submission.future.set_exception(error)
+
+
+def write_behind_enabled() -> bool:
+    return os.environ.get("DISH_HISTORY_WRITE_BEHIND", "") == "1"
+
+
+def get_history_write_queue() -> HistoryWriteQueue:
+    """Return the process-wide write-behind queue, starting it on first use.
+
+    The queue is closed at interpreter exit, so rows still queued when the process is stopped
+    (SIGTERM is turned into a normal exit by uvicorn and Streamlit) are written before it ends.
+    """
+    global _queue
+    if _queue is not None:
+        return _queue
+
+    with _queue_lock:
+        if _queue is None:
+            _queue = HistoryWriteQueue()
+            atexit.register(_queue.close)
+    return _queue
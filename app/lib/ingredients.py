@@ -0,0 +1,127 @@
+from collections.abc import Iterable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from lib.util import format_number
+
+# 換算できる単位 → (基準単位, 基準単位への倍率)
+UNIT_CONVERSIONS: dict[str, tuple[str, float]] = {
+    "g": ("g", 1.0),
+    "kg": ("g", 1000.0),
+    "ml": ("ml", 1.0),
+    "mL": ("ml", 1.0),
+    "cc": ("ml", 1.0),
+    "l": ("ml", 1000.0),
+    "L": ("ml", 1000.0),
+    "カップ": ("ml", 200.0),
+    "大さじ": ("ml", 15.0),
+    "小さじ": ("ml", 5.0),
+}
+
+
+class IngredientIndex:
+    """Ingredients table grouped by menu into contiguous row ranges.
+
+    Built once per load of the ingredients table. Rows of the same menu are stored next to
+    each other (keeping their original order), so looking up a dish is a dict access plus a slice.
+    Ingredient names and units (normalized with ``UNIT_CONVERSIONS``) are also integer-coded
+    for aggregation in ``lib.shopping``.
+    """
+
+    def __init__(self, df_ingredients: pd.DataFrame):
+        self._build(
+            df_ingredients["menu"].to_numpy(dtype=object),
+            df_ingredients["ingredients"].to_numpy(dtype=object),
+            df_ingredients["number"].to_numpy(dtype=np.float64),
+            df_ingredients["units"].to_numpy(dtype=object),
+        )
+
+    @classmethod
+    def from_arrow(cls, table: pa.Table) -> "IngredientIndex":
+        """Build the index from an Arrow table with the ingredients table columns, without going through pandas.
+
+        When the table is already sorted by menu (as DiskCachedRepository stores it) and ``number``
+        is a float64 column without nulls, ``numbers`` is a view of the table's buffer, so with a
+        memory-mapped file those pages are shared with other processes. The string columns, the
+        formatted lines and the lookup dict are still built in each process.
+        """
+        number = table.column("number")
+        if number.type != pa.float64():
+            number = number.cast(pa.float64())
+        numbers = number.combine_chunks().to_numpy(zero_copy_only=False)
+        index = cls.__new__(cls)
+        index._build(
+            table.column("menu").to_numpy(),
+            table.column("ingredients").to_numpy(),
+            numbers,
+            table.column("units").to_numpy(),
+        )
+        return index
+
+    def _build(self, menus: np.ndarray, ingredients: np.ndarray, numbers: np.ndarray, units: np.ndarray) -> None:
+        menus = menus.astype(object, copy=False)
+        order = np.argsort(menus, kind="stable")
+        if not (order[1:] > order[:-1]).all():
+            menus, ingredients, numbers, units = menus[order], ingredients[order], numbers[order], units[order]
+
+        self.menus: np.ndarray = menus
+        self.ingredients: np.ndarray = ingredients.astype(object, copy=False)
+        self.numbers: np.ndarray = numbers
+        self.units: np.ndarray = units.astype(object, copy=False)
+        self.lines: list[str] = [
+            f"{ingredient} {format_number(number)}{unit}"
+            for ingredient, number, unit in zip(self.ingredients, self.numbers, self.units, strict=True)
+        ]
+
+        names, starts, counts = np.unique(menus.astype(str), return_index=True, return_counts=True)
+        self.ranges: dict[str, tuple[int, int]] = {
+            str(name): (int(start), int(start + count)) for name, start, count in zip(names, starts, counts, strict=True)
+        }
+
+        units_series = pd.Series(self.units, dtype=object).fillna("")
+        factors = units_series.map(lambda unit: UNIT_CONVERSIONS[unit][1] if unit in UNIT_CONVERSIONS else 1.0)
+        base_units = units_series.map(lambda unit: UNIT_CONVERSIONS[unit][0] if unit in UNIT_CONVERSIONS else unit)
+        self.base_numbers: np.ndarray = self.numbers * factors.to_numpy(dtype=np.float64)
+        self.ingredient_codes, self.ingredient_names = pd.factorize(self.ingredients, sort=True)
+        self.base_unit_codes, self.base_unit_names = pd.factorize(base_units.to_numpy(dtype=object), sort=True)
+        self._texts: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __contains__(self, dish: object) -> bool:
+        return dish in self.ranges
+
+    def lines_for(self, dish: str) -> list[str]:
+        """「材料 分量単位」形式に整形済みの材料リストを返す."""
+        start, stop = self.ranges.get(dish, (0, 0))
+        return self.lines[start:stop]
+
+    def text_for(self, dish: str) -> str:
+        """lines_for を改行でつないだ表示用テキスト (メニューごとに1回だけ作る)."""
+        text = self._texts.get(dish)
+        if text is None:
+            text = self._texts[dish] = "\n".join(self.lines_for(dish))
+        return text
+
+    def positions(self, dishes: Iterable[str]) -> np.ndarray:
+        """Row positions of all ingredients of ``dishes`` (a dish listed twice is counted twice)."""
+        ranges = np.array([self.ranges[dish] for dish in dishes if dish in self.ranges], dtype=np.intp).reshape(-1, 2)
+        starts, lengths = ranges[:, 0], ranges[:, 1] - ranges[:, 0]
+        # 各範囲の先頭からの連番を一度に作る
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return offsets + np.arange(lengths.sum(), dtype=np.intp)
+
+    def to_frame(self, dishes: Iterable[str]) -> pd.DataFrame:
+        """Ingredient rows of ``dishes`` as a DataFrame with the ingredients table columns."""
+        positions = self.positions(dishes)
+        return pd.DataFrame(
+            {
+                "menu": self.menus[positions],
+                "ingredients": self.ingredients[positions],
+                "number": self.numbers[positions],
+                "units": self.units[positions],
+            }
+        )
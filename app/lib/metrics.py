@@ -0,0 +1,227 @@
+"""Lightweight tracing spans and an in-process metrics registry.
+
+Tracing is enabled with ``DISH_TRACING=1``. When disabled, ``span()`` returns a shared no-op
+object and ``inc()`` / ``observe()`` return immediately, so instrumented hot paths cost a
+function call and an attribute check. When enabled, every span is
+
+- logged as one JSON object on the ``lib.metrics`` logger (with all its fields), and
+- recorded in the registry as ``span_duration_seconds{span=..., <labels>}``.
+
+The registry can be scraped in Prometheus text format from ``start_metrics_server()``
+(started automatically by ``configure_observability()`` when ``DISH_METRICS_PORT`` is set).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+_enabled = os.environ.get("DISH_TRACING", "") == "1"
+
+
+class MetricsRegistry:
+    """Thread-safe counters and summaries (count / sum / max) keyed by name and labels."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, LabelKey], float] = {}
+        self._summaries: dict[tuple[str, LabelKey], list[float]] = {}
+        self._collectors: list[Callable[[], dict[tuple[str, LabelKey], float]]] = []
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, Any]) -> tuple[str, LabelKey]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0.0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+    def add_collector(self, collector: Callable[[], dict[tuple[str, LabelKey], float]]) -> None:
+        """Register a callback returning gauge values (e.g. cache stats) evaluated at scrape time."""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict[str, list[dict[str, Any]]]:
+        with self._lock:
+            counters = dict(self._counters)
+            summaries = {key: list(value) for key, value in self._summaries.items()}
+        gauges: dict[tuple[str, LabelKey], float] = {}
+        for collector in self._collectors:
+            gauges.update(collector())
+
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters.items()],
+            "summaries": [
+                {"name": name, "labels": dict(labels), "count": count, "sum": total, "max": maximum}
+                for (name, labels), (count, total, maximum) in summaries.items()
+            ],
+            "gauges": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in gauges.items()],
+        }
+
+    def render_prometheus(self) -> str:
+        def series(name: str, labels: dict[str, str]) -> str:
+            if not labels:
+                return name
+            return name + "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+        snapshot = self.snapshot()
+        lines = [f"{series(c['name'], c['labels'])} {c['value']}" for c in snapshot["counters"]]
+        lines += [f"{series(g['name'], g['labels'])} {g['value']}" for g in snapshot["gauges"]]
+        for s in snapshot["summaries"]:
+            lines.append(f"{series(s['name'] + '_count', s['labels'])} {s['count']}")
+            lines.append(f"{series(s['name'] + '_sum', s['labels'])} {s['sum']}")
+            lines.append(f"{series(s['name'] + '_max', s['labels'])} {s['max']}")
+        return "\n".join(sorted(lines)) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+registry = MetricsRegistry()
+
+
+class Span:
+    """A timed operation. ``labels`` become metric labels; ``set()`` adds fields that are only logged."""
+
+    __slots__ = ("name", "labels", "fields", "start", "duration")
+
+    def __init__(self, name: str, labels: dict[str, Any]):
+        self.name = name
+        self.labels = labels
+        self.fields: dict[str, Any] = {}
+        self.start = 0.0
+        self.duration = 0.0
+
+    def set(self, **fields: Any) -> None:
+        self.fields.update(fields)
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc: BaseException | None, traceback: Any) -> None:
+        self.duration = time.perf_counter() - self.start
+        status = "ok" if exc_type is None else exc_type.__name__
+        registry.observe("span_duration_seconds", self.duration, span=self.name, **self.labels)
+        record = {"span": self.name, "duration_ms": round(self.duration * 1000, 3), "status": status, **self.labels, **self.fields}
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **fields: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc: BaseException | None, traceback: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def tracing_enabled() -> bool:
+    return _enabled
+
+
+def set_tracing(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def span(name: str, **labels: Any) -> Span | _NullSpan:
+    """Time a block: ``with span("bigquery.query", table="main_dish") as s: ...; s.set(rows=n)``."""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, labels)
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    if _enabled:
+        registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    if _enabled:
+        registry.observe(name, value, **labels)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line (span records are already JSON and are merged in)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        entry: dict[str, Any] = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name}
+        try:
+            fields = json.loads(message)
+            entry.update(fields if isinstance(fields, dict) else {"message": message})
+        except ValueError:
+            entry["message"] = message
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path == "/metrics":
+            body, content_type = registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(registry.snapshot(), ensure_ascii=False).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+_server: ThreadingHTTPServer | None = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` (Prometheus text) and ``/metrics.json`` from a daemon thread (once per process)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
+
+
+def configure_observability() -> None:
+    """Set up JSON logging (``DISH_LOG_FORMAT=json``) and the scrape endpoint (``DISH_METRICS_PORT``)."""
+    if os.environ.get("DISH_LOG_FORMAT") == "json":
+        root = logging.getLogger()
+        if not any(isinstance(handler.formatter, JsonFormatter) for handler in root.handlers):
+            handler = logging.StreamHandler()
+            handler.setFormatter(JsonFormatter())
+            root.addHandler(handler)
+            root.setLevel(logging.INFO)
+    if port := os.environ.get("DISH_METRICS_PORT"):
+        start_metrics_server(int(port))
@@ -0,0 +1,92 @@
+import random
+from collections.abc import Iterable, Sequence
+from datetime import date, timedelta
+
+import numpy as np
+
+from lib.catalog import MenuCatalog, as_catalog
+from lib.recipe import get_day_weights, solve_weekly_plan
+from lib.repository import today_in_japan
+from lib.solver import DEFAULT_WEEKLY_CONSTRAINTS, WeeklyConstraints
+from lib.util import Menu
+
+MAX_WEEKS = 8
+# 前の週の選び方によって後の週が組めない場合に、最初から作り直す回数
+MAX_ATTEMPTS = 20
+
+_NEVER = -(1 << 40)
+
+
+class LastServedIndex:
+    """Day number (``date.toordinal()``) on which each dish of a catalog was last served.
+
+    Built once from the history; afterwards marking a dish as served and checking whether every
+    dish's ``interval`` has elapsed on a given day are O(1) per dish (vectorized over the catalog).
+    """
+
+    def __init__(self, catalog: MenuCatalog, history: Iterable[tuple[date, str]] = ()):
+        self.catalog = catalog
+        self.days = np.full(len(catalog), _NEVER, dtype=np.int64)
+        for day, name in history:
+            if (i := catalog.ids.get(name)) is not None:
+                self.days[i] = max(self.days[i], day.toordinal())
+
+    def copy(self) -> "LastServedIndex":
+        index = LastServedIndex(self.catalog)
+        index.days = self.days.copy()
+        return index
+
+    def serve(self, dish: int, day: date) -> None:
+        self.days[dish] = max(self.days[dish], day.toordinal())
+
+    def available(self, day: date) -> np.ndarray:
+        """Boolean mask of the dishes whose interval has elapsed on ``day``."""
+        return day.toordinal() - self.days >= self.catalog.intervals
+
+
+def plan_weeks(
+    dishes: Sequence[Menu],
+    history: tuple[list[str], list[date]],
+    n_weeks: int,
+    start: date | None = None,
+    constraints: WeeklyConstraints = DEFAULT_WEEKLY_CONSTRAINTS,
+    rng: random.Random | None = None,
+    preference: np.ndarray | None = None,
+) -> list[list[Menu]]:
+    """Plan ``n_weeks`` consecutive weeks starting at ``start`` (default: today in Japan).
+
+    A dish can be served again only after its ``interval`` days have passed since it was last
+    served, counting both ``history`` (menu names and dates as returned by get_recent_menu) and
+    the weeks planned before it. The weekly rules of get_weekly_dish (season, holidays, storability,
+    ingredient / category caps and no repeats) apply within each week, and ``preference`` (per-dish
+    weights from lib.preference) scales the selection weights as it does there.
+    """
+    if not 1 <= n_weeks <= MAX_WEEKS:
+        raise ValueError(f"n_weeks must be between 1 and {MAX_WEEKS}")
+
+    catalog = as_catalog(dishes)
+    start = start or today_in_japan()
+    menus, dates = history
+    served = LastServedIndex(catalog, zip(dates, menus, strict=True))
+
+    for _ in range(MAX_ATTEMPTS):
+        last_served = served.copy()
+        weeks: list[list[int]] = []
+        for week in range(n_weeks):
+            week_start = start + timedelta(weeks=week)
+            available = np.stack([last_served.available(week_start + timedelta(days=day)) for day in range(constraints.n_days)])
+            plan = solve_weekly_plan(
+                catalog, get_day_weights(catalog, [], week_start, constraints, available, preference), constraints, rng
+            )
+            if plan is None:
+                # 最初の週が組めないのはそれまでの選び方によらないので、作り直しても変わらない
+                if week == 0:
+                    raise ValueError("No menu available for selection based on constraints.")
+                break
+            for day, dish in enumerate(plan):
+                last_served.serve(dish, week_start + timedelta(days=day))
+            weeks.append(plan)
+        else:
+            return [[catalog[int(i)] for i in plan] for plan in weeks]
+
+    raise ValueError("No menu available for selection based on constraints.")
@@ -0,0 +1,189 @@
+import logging
+import os
+import random
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import date
+from functools import cache
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from lib.cache import MAX_CACHED_HOUSEHOLDS, fetch_recent_menu_list
+from lib.catalog import MenuCatalog
+from lib.metrics import span
+from lib.recipe import get_recent_menu
+from lib.repository import DEFAULT_HOUSEHOLD
+
+# scikit-learn / SciPy の読み込みには 0.5 秒以上かかるので、DISH_PREFERENCE=1 で最初に使うときまで遅らせる
+if TYPE_CHECKING:
+    from scipy import sparse
+    from sklearn.feature_extraction import FeatureHasher
+
+logger = logging.getLogger(__name__)
+
+# 特徴量の次元数。値の種類ではなくハッシュで列を決めるので、カタログが変わっても係数をそのまま使える
+N_FEATURES = 1 << 10
+# 履歴 1 件あたりに比べる、その日に出なかったメニューの数
+NEGATIVES_PER_ROW = 8
+# 最初の学習に使う履歴の日数
+PREFERENCE_HISTORY_DAYS = int(os.environ.get("DISH_PREFERENCE_HISTORY_DAYS", "365"))
+# スコアを重みにするときの強さ。重みは exp(STRENGTH * スコア) を平均 1 付近に寄せたもの
+PREFERENCE_STRENGTH = float(os.environ.get("DISH_PREFERENCE_STRENGTH", "0.5"))
+# スコアの外れ値で重みが極端にならないようにする幅
+MAX_SCORE_DEVIATION = 3.0
+
+_features: "weakref.WeakKeyDictionary[MenuCatalog, sparse.csr_matrix]" = weakref.WeakKeyDictionary()
+
+
+@cache
+def _hasher() -> "FeatureHasher":
+    from sklearn.feature_extraction import FeatureHasher
+
+    return FeatureHasher(n_features=N_FEATURES, input_type="string", alternate_sign=False)
+
+
+def _hashed_columns(field: str, values: list) -> np.ndarray:
+    """Feature column of each distinct value of ``field``."""
+    return _hasher().transform([[f"{field}={value}"] for value in values]).indices
+
+
+def catalog_features(catalog: MenuCatalog) -> "sparse.csr_matrix":
+    """One-hot (hashed) features of every dish as a sparse (dishes, N_FEATURES) matrix, built once per catalog.
+
+    Each dish has one non-zero per field: cooking method, main ingredient, category and season.
+    Only the distinct values are hashed; the rows are assembled from the catalog's integer codes.
+    """
+    if (features := _features.get(catalog)) is not None:
+        return features
+
+    from scipy import sparse
+
+    fields = [
+        ("cooking_method", catalog.cooking_method_codes, catalog.cooking_method_names),
+        ("main_ingredient", catalog.ingredient_codes, catalog.ingredient_names),
+        ("category", catalog.category_codes, catalog.category_names),
+        ("season", catalog.season_codes, catalog.season_names),
+    ]
+    columns = np.stack([_hashed_columns(field, names)[codes] for field, codes, names in fields], axis=1)
+    indptr = np.arange(0, columns.size + 1, len(fields))
+    features = sparse.csr_matrix((np.ones(columns.size), columns.reshape(-1), indptr), shape=(len(catalog), N_FEATURES))
+    # 同じ列に当たった値は 1 つにまとめる
+    features.sum_duplicates()
+    _features[catalog] = features
+    return features
+
+
+class PreferenceModel:
+    """Household preference over dish features, learned from the dish history.
+
+    Each served dish is a positive example and a few dishes not served that day are negatives, so
+    the model learns which cooking methods, ingredients, categories and seasons are chosen more
+    often than chance. ``update`` trains on history rows it has not seen yet with ``partial_fit``,
+    and ``weights`` scores the whole catalog with one sparse matrix-vector product (cached until
+    the model or the catalog changes).
+    """
+
+    def __init__(self, negatives: int = NEGATIVES_PER_ROW, strength: float = PREFERENCE_STRENGTH, seed: int = 0):
+        from sklearn.linear_model import SGDClassifier
+
+        self.negatives = negatives
+        self.strength = strength
+        self.rng = random.Random(seed)
+        self.classifier = SGDClassifier(loss="log_loss", alpha=1e-3, random_state=seed)
+        self.seen: set[tuple[date, str]] = set()
+        self.fitted = False
+        self._scored: tuple[MenuCatalog, np.ndarray] | None = None
+
+    def update(self, catalog: MenuCatalog, history: Iterable[tuple[date, str]]) -> int:
+        """Train on the (date, menu) rows not seen before; returns the number of new rows."""
+        new_rows = [(day, name) for day, name in history if (day, name) not in self.seen and name in catalog.ids]
+        if not new_rows:
+            return 0
+
+        with span("preference.fit", rows=len(new_rows)):
+            rows: list[int] = []
+            labels: list[int] = []
+            for _, name in new_rows:
+                served = catalog.ids[name]
+                others = [i for i in self.rng.sample(range(len(catalog)), min(self.negatives + 1, len(catalog))) if i != served]
+                rows += [served, *others[: self.negatives]]
+                labels += [1] + [0] * min(self.negatives, len(others))
+            self.classifier.partial_fit(catalog_features(catalog)[rows], np.array(labels), classes=np.array([0, 1]))
+
+        self.seen.update(new_rows)
+        self.fitted = True
+        self._scored = None
+        return len(new_rows)
+
+    def scores(self, catalog: MenuCatalog) -> np.ndarray:
+        """Decision value of every dish (higher means preferred)."""
+        return catalog_features(catalog) @ self.classifier.coef_[0] + self.classifier.intercept_[0]
+
+    def weights(self, catalog: MenuCatalog) -> np.ndarray:
+        """Positive selection weight of every dish, centred so that an average dish has weight ~1."""
+        if self._scored is None or self._scored[0] is not catalog:
+            scores = self.scores(catalog)
+            deviation = np.clip(scores - scores.mean(), -MAX_SCORE_DEVIATION, MAX_SCORE_DEVIATION)
+            self._scored = catalog, np.exp(self.strength * deviation)
+        return self._scored[1]
+
+
+@dataclass
+class _HouseholdModel:
+    model: PreferenceModel = field(default_factory=PreferenceModel)
+    # 最初の学習 (PREFERENCE_HISTORY_DAYS 日分の履歴の取得と学習) とその後の更新は、世帯ごとにこのロックで直列にする
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    initialized: bool = False
+
+
+# 世帯ごとのモデル (最も長く使われていない世帯から MAX_CACHED_HOUSEHOLDS を超えた分を捨てる)。
+# _models_lock は辞書の操作だけに使い、履歴の取得や学習の間は持たない
+_models: OrderedDict[str, _HouseholdModel] = OrderedDict()
+_models_lock = threading.Lock()
+
+
+def preference_enabled() -> bool:
+    return os.environ.get("DISH_PREFERENCE", "") == "1"
+
+
+def _household_model(household: str) -> _HouseholdModel:
+    with _models_lock:
+        entry = _models.get(household)
+        if entry is None:
+            entry = _models[household] = _HouseholdModel()
+        _models.move_to_end(household)
+        if len(_models) > MAX_CACHED_HOUSEHOLDS:
+            _models.popitem(last=False)
+        return entry
+
+
+def get_preference_weights(catalog: MenuCatalog, household: str = DEFAULT_HOUSEHOLD) -> np.ndarray | None:
+    """The household's preference weight of every dish in ``catalog``, or None when preference scoring is off.
+
+    The household's model is trained on its last PREFERENCE_HISTORY_DAYS of history the first time,
+    then updated with whatever its recent menu cache has that it has not seen (e.g. just-registered rows).
+    Only calls for the same household wait for each other while history is read and the model trained.
+    """
+    if not preference_enabled():
+        return None
+
+    entry = _household_model(household)
+    with entry.lock:
+        if not entry.initialized:
+            menus, dates = get_recent_menu(days=PREFERENCE_HISTORY_DAYS, household=household)
+            entry.model.update(catalog, zip(dates, menus, strict=True))
+            entry.initialized = True
+        menus, dates = fetch_recent_menu_list(household)
+        entry.model.update(catalog, zip(dates, menus, strict=True))
+        if not entry.model.fitted:
+            return None
+        return entry.model.weights(catalog)
+
+
+def reset_preference_models() -> None:
+    with _models_lock:
+        _models.clear()
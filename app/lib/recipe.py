@@ -1,168 +1,194 @@
+import logging
 import random
-from collections import defaultdict
-from datetime import datetime, timedelta
+import time
+from collections.abc import Sequence
+from concurrent.futures import Future
+from datetime import date, timedelta
 
+import numpy as np
 import pandas as pd
-from google.cloud import bigquery
 
-from lib.util import Menu, get_bigquery_client
+from lib.catalog import SUMMER_MONTHS, WINTER_MONTHS, MenuCatalog, as_catalog
+from lib.history_writer import get_history_write_queue, write_behind_enabled
+from lib.ingredients import IngredientIndex
+from lib.metrics import span
+from lib.repository import DEFAULT_HOUSEHOLD, HISTORY_DAYS, get_repository, history_versions, today_in_japan
+from lib.solver import DEFAULT_WEEKLY_CONSTRAINTS, WeeklyConstraints, solve_plan
+from lib.util import Menu
 
+logger = logging.getLogger(__name__)
 
-def get_recent_menu() -> tuple[list[str], list[str]]:
-    client = get_bigquery_client()
-    QUERY = """
-        SELECT date, menu
-        FROM my_recipe_app.dish_history
-        WHERE date >= current_date('Asia/Tokyo') - 14
-        ORDER BY date desc
-    """
-    query_job = client.query(QUERY)
+# 提案から除外する直近のメニュー数
+RECENT_MENU_LIMIT = 7
+
+
+def get_recent_menu(days: int = HISTORY_DAYS, household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+    return get_repository().get_recent_menu(days, household)
 
-    menu_list = [row["menu"] for row in query_job]
-    date_list = [row["date"] for row in query_job]
-    return menu_list, date_list
+
+def get_history_since(since: date, household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+    return get_repository().get_history_since(since, household)
 
 
 def get_menu_data() -> list[Menu]:
-    client = get_bigquery_client()
-    QUERY = "SELECT * FROM my_recipe_app.main_dish"
-    query_job = client.query(QUERY)
-
-    menu_list = [
-        Menu(
-            name=row["menu"],
-            season=row["season"],
-            holiday_only=row["holiday_flag"],
-            not_storable=row["store_flag"],
-            interval=row["interval"],
-            cooking_method=row["utensil"],
-            main_ingredient=row["main_ingredients"],
-            category=row["category"],
-        )
-        for row in query_job
-    ]
-
-    return menu_list
+    return get_repository().get_menu_data()
 
 
 def get_ingredients_data() -> pd.DataFrame:
-    client = get_bigquery_client()
-    QUERY = "SELECT * FROM my_recipe_app.ingredients"
-    query_job = client.query(QUERY)
-    df_ingredients = query_job.to_dataframe()
+    return get_repository().get_ingredients_data()
+
+
+def get_menu_catalog() -> MenuCatalog:
+    return get_repository().get_menu_catalog()
 
-    return df_ingredients
 
+def get_ingredient_index() -> IngredientIndex:
+    return get_repository().get_ingredient_index()
 
-def filter_menu_by_season(menu_list: list[Menu], month: int) -> list[Menu]:
+
+def filter_menu_by_season(menu_list: Sequence[Menu], month: int) -> list[Menu]:
     """月(季節)に応じて夏・冬メニューを除外する."""
-    filtered = menu_list[:]
-    if month not in [6, 7, 8, 9]:
+    if isinstance(menu_list, MenuCatalog):
+        return menu_list.select(menu_list.season_mask(month))
+
+    filtered = list(menu_list)
+    if month not in SUMMER_MONTHS:
         filtered = [menu for menu in filtered if menu.season != "夏"]
-    if month not in [11, 12, 1, 2, 3]:
+    if month not in WINTER_MONTHS:
         filtered = [menu for menu in filtered if menu.season != "冬"]
     return filtered
 
 
-def filter_menu_by_holiday(menu_list: list[Menu], is_weekend: bool) -> list[Menu]:
+def filter_menu_by_holiday(menu_list: Sequence[Menu], is_weekend: bool) -> list[Menu]:
+    if isinstance(menu_list, MenuCatalog):
+        return menu_list.select(menu_list.holiday_mask(is_weekend))
+
     return [menu for menu in menu_list if (not menu.holiday_only or is_weekend)]
 
 
-def get_weekly_dish(dishes: list[Menu], recent_menu: list[str]) -> list[Menu]:
+def get_day_weights(
+    catalog: MenuCatalog,
+    recent_menu: Sequence[str],
+    start: date,
+    constraints: WeeklyConstraints = DEFAULT_WEEKLY_CONSTRAINTS,
+    available: np.ndarray | None = None,
+    preference: np.ndarray | None = None,
+) -> np.ndarray:
     """
-    1週間分のメニューを選定する。
-    季節、休日、食材・カテゴリ使用数の制約を適用したうえで、週替わりメニューを決定する。
+    各日・各メニューの選択重みを (日数, メニュー数) の配列で返す。0 はその日に選べないことを表す。
+    季節・直近メニュー・休日限定・保存不可の除外と、
+    週末の休日限定メニュー・storable_from_day より前の日の保存不可メニューの重み付けを適用する。
+    available ((日数, メニュー数) の bool 配列) を渡すと、False の組み合わせも除外する。
+    preference (メニューごとの好みの重み、lib.preference) を渡すと、各日の重みに掛ける。
     """
+    base = catalog.season_mask(start.month) & ~catalog.names_mask(recent_menu)
 
-    constraints_ingredients = {
-        "海鮮": 2,
-        "牛肉": 2,
-        "豚肉": 3,
-        "鶏肉": 3,
-    }
-    constraints_category = {"カレー・シチュー": 1, "クックドゥ": 1, "鍋": 1}
-
-    used_ingredients_counts: defaultdict[str, int] = defaultdict(int)
-    used_category_counts: defaultdict[str, int] = defaultdict(int)
-
-    weekly_menu = []
-    today = datetime.today()
-    month = today.month
-    days_of_week = [(today + timedelta(days=i)).strftime("%m/%d(%a)") for i in range(7)]
-
-    # 季節フィルタリング(週単位で一度実行)
-    menu_list = filter_menu_by_season(dishes, month)
-    menu_list = [menu for menu in menu_list if menu.name not in recent_menu]
-
-    for idx, day_str in enumerate(days_of_week):
-        is_weekend = day_str.endswith("(Sat)") or day_str.endswith("(Sun)")
-        is_today_or_next = idx in [0, 1]
-
-        filtered_menu = filter_menu_by_holiday(menu_list, is_weekend)
-
-        # 使用回数制約の適用
-        filtered_menu = [
-            menu
-            for menu in filtered_menu
-            if (used_ingredients_counts[menu.main_ingredient] < constraints_ingredients.get(menu.main_ingredient, float("inf")))
-            and (menu.category is None or used_category_counts[menu.category] < constraints_category.get(menu.category, float("inf")))
-            and menu not in weekly_menu
-        ]
-
+    weights = np.zeros((constraints.n_days, len(catalog)), dtype=np.float64)
+    for idx in range(constraints.n_days):
+        is_weekend = (start + timedelta(days=idx)).weekday() >= 5
+        mask = base & catalog.holiday_mask(is_weekend)
         # 今日・明日以降は保存不可(not_storable)メニューを除外
-        if idx > 1:
-            filtered_menu = [menu for menu in filtered_menu if not menu.not_storable]
-
-        if not filtered_menu:
-            raise ValueError("No menu available for selection based on constraints.")
-
-        weights = [5 if menu.holiday_only and is_weekend else 1 for menu in filtered_menu]
-        weights = [5 if menu.not_storable and is_today_or_next else weight for menu, weight in zip(filtered_menu, weights, strict=True)]
-        selected_menu = random.choices(filtered_menu, weights=weights, k=1)[0]
-        weekly_menu.append(selected_menu)
+        if idx >= constraints.storable_from_day:
+            mask &= ~catalog.not_storable
+
+        day = np.ones(len(catalog), dtype=np.float64)
+        if is_weekend:
+            day[catalog.holiday_only] = constraints.holiday_weight
+        if idx < constraints.storable_from_day:
+            day[catalog.not_storable] = constraints.not_storable_weight
+        if available is not None:
+            mask &= available[idx]
+        if preference is not None:
+            day *= preference
+        weights[idx] = np.where(mask, day, 0.0)
+    return weights
+
+
+def solve_weekly_plan(
+    catalog: MenuCatalog,
+    weights: np.ndarray,
+    constraints: WeeklyConstraints = DEFAULT_WEEKLY_CONSTRAINTS,
+    rng: random.Random | None = None,
+) -> list[int] | None:
+    """get_day_weights の重みから、食材・カテゴリの使用回数制約を満たす1週間分のメニュー番号を選ぶ (なければ None)."""
+    day_candidates = [np.flatnonzero(day) for day in weights]
+    day_weights = [day[candidates] for day, candidates in zip(weights, day_candidates, strict=True)]
+
+    return solve_plan(
+        day_candidates,
+        day_weights,
+        catalog.ingredient_codes.tolist(),
+        catalog.ingredient_caps(constraints.ingredient_caps).tolist(),
+        catalog.category_codes.tolist(),
+        catalog.category_caps(constraints.category_caps).tolist(),
+        rng,
+    )
+
+
+def get_weekly_dish(
+    dishes: Sequence[Menu],
+    recent_menu: list[str],
+    constraints: WeeklyConstraints = DEFAULT_WEEKLY_CONSTRAINTS,
+    rng: random.Random | None = None,
+    preference: np.ndarray | None = None,
+    start: date | None = None,
+) -> list[Menu]:
+    """
+    start (既定: 日本時間の今日) から1週間分のメニューを選定する。
+    季節、休日、食材・カテゴリ使用数の制約を適用したうえで、週替わりメニューを決定する。
+    制約を満たす組み合わせが存在する限り、バックトラックで必ず見つける。
+    preference を渡すと、好みの重みに比例して選ばれやすくなる。
+    """
+    catalog = as_catalog(dishes)
+    weights = get_day_weights(catalog, recent_menu, start or today_in_japan(), constraints, preference=preference)
 
-        used_ingredients_counts[selected_menu.main_ingredient] += 1
-        if selected_menu.category:
-            used_category_counts[selected_menu.category] += 1
+    # 使用回数制約
+    plan = solve_weekly_plan(catalog, weights, constraints, rng)
+    if plan is None:
+        raise ValueError("No menu available for selection based on constraints.")
 
-    return weekly_menu
+    return [catalog[int(i)] for i in plan]
 
 
-def get_todays_dish(dishes: list[Menu], recent_menu: list[str]) -> Menu:
-    today = datetime.today()
+def get_todays_dish(
+    dishes: Sequence[Menu], recent_menu: list[str], preference: np.ndarray | None = None, today: date | None = None
+) -> Menu:
+    """today (既定: 日本時間の今日) の季節・曜日に合うメニューを1つ選ぶ."""
+    today = today or today_in_japan()
     month = today.month
     weekday = today.weekday()
     is_weekend = weekday >= 5
 
-    # 季節・休日フィルタリングを共通関数で適用
-    menu_list = filter_menu_by_season(dishes, month)
-    menu_list = filter_menu_by_holiday(menu_list, is_weekend)
-    menu_list = [menu for menu in menu_list if menu.name not in recent_menu]
+    # 季節・休日フィルタリングをマスクの AND で適用
+    catalog = as_catalog(dishes)
+    mask = catalog.season_mask(month) & catalog.holiday_mask(is_weekend) & ~catalog.names_mask(recent_menu)
 
-    todays_dishes = random.sample(menu_list, 1)[0]
+    candidates = np.flatnonzero(mask).tolist()
+    if not candidates:
+        raise ValueError("No menu available for selection based on constraints.")
+    if preference is None:
+        todays_dishes = catalog[random.sample(candidates, 1)[0]]
+    else:
+        # 好みの重みに比例して選ぶ
+        todays_dishes = catalog[random.choices(candidates, weights=preference[candidates].tolist())[0]]
 
     return todays_dishes
 
 
-def register_dish_history(df: pd.DataFrame) -> None:
-    client = get_bigquery_client()
-    table_id = "my_recipe_app.dish_history"
-    schema = [
-        bigquery.SchemaField("date", "DATE"),
-        bigquery.SchemaField("menu", "STRING"),
-    ]
-    job_config = bigquery.LoadJobConfig(schema=schema, write_disposition="WRITE_TRUNCATE")
-    temp_table_id = f"{table_id}_temp"
-    client.load_table_from_dataframe(df, temp_table_id, job_config=job_config).result()
-
-    # Use MERGE statement to update the main table with the temporary table
-    merge_query = f"""
-    MERGE `{table_id}` T
-    USING `{temp_table_id}` S
-    ON T.date = S.date
-    WHEN MATCHED THEN
-        UPDATE SET T.menu = S.menu
-    WHEN NOT MATCHED THEN
-        INSERT (date, menu) VALUES (S.date, S.menu)
+def register_dish_history(df: pd.DataFrame, household: str = DEFAULT_HOUSEHOLD) -> Future[None] | None:
+    """
+    household が食べたメニュー(date, menu)を dish_history に登録する。
+    DISH_HISTORY_WRITE_BEHIND=1 のときは書き込みキューに積んですぐに戻り、他のセッション・世帯の登録とまとめて書き込む。
+    このときは書き込みが終わる(再試行しても失敗したときは例外になる) Future を返し、それ以外は書き込んでから None を返す。
     """
-    client.query(merge_query).result()
+    df = df.assign(household_id=household)
+    start = time.perf_counter()
+    pending: Future[None] | None = None
+    with span("history.register", write_behind=write_behind_enabled()) as register_span:
+        register_span.set(rows=len(df))
+        if write_behind_enabled():
+            pending = get_history_write_queue().submit(df)
+        else:
+            history_versions.register(df)
+    logger.info("Registered %d history rows in %.3fs (write_behind=%s)", len(df), time.perf_counter() - start, write_behind_enabled())
+    return pending
@@ -0,0 +1,608 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Hashable, Iterator, Mapping
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+import pyarrow as pa
+
+from lib.catalog import MenuCatalog
+from lib.fetch import fetch_arrow, fetch_columns
+from lib.ingredients import IngredientIndex
+from lib.metrics import inc, span
+from lib.table_store import TableStore, menus_from_table, menus_to_table
+from lib.util import Menu, get_bigquery_client
+
+DATASET = "my_recipe_app"
+# 提案で参照する履歴の期間(日)
+HISTORY_DAYS = int(os.environ.get("DISH_HISTORY_DAYS", "14"))
+# 世帯を指定しないときの世帯 ID (household_id 列を追加する前の履歴もこの世帯になる)
+DEFAULT_HOUSEHOLD = "default"
+# 世帯 ID に使える文字列 (英数字・_・-、64 文字まで)
+HOUSEHOLD_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+HISTORY_COLUMNS = ["household_id", "date", "menu"]
+# DiskCachedRepository で、直前に確認したテーブルのバージョンを読み込みで使い回す期間(秒)
+VERSION_REUSE_SECONDS = 5.0
+# dish_history に household_id 列がないとき (移行前)、列が追加されたかを確認し直す間隔(秒)
+HOUSEHOLD_COLUMN_RECHECK_SECONDS = 300.0
+# 自分の書き込みによるとみなした dish_history の変更を、全世帯の変更として扱い直すまでの時間(秒)
+HISTORY_REVALIDATE_INTERVAL = float(os.environ.get("DISH_HISTORY_REVALIDATE_INTERVAL", "600"))
+
+# dish_history を月単位のパーティション・世帯とメニューでのクラスタリングに作り直す DDL。
+# 履歴の取得は世帯と date の範囲指定なので、読み込むのは対象期間のパーティションの該当世帯のブロックだけになる。
+# household_id 列がまだないテーブルでは {household_id} に DEFAULT_HOUSEHOLD のリテラルを入れる
+PARTITION_DISH_HISTORY_DDL = """
+CREATE OR REPLACE TABLE `{dataset}.dish_history`
+PARTITION BY DATE_TRUNC(date, MONTH)
+CLUSTER BY household_id, menu
+AS SELECT {household_id} AS household_id, date, menu FROM `{dataset}.dish_history`
+"""
+
+_repository: "DishRepository | None" = None
+_repository_lock = threading.Lock()
+
+
+def _menus_from_columns(columns: Mapping[str, list[Any]]) -> list[Menu]:
+    return [
+        Menu(
+            name=name,
+            season=season,
+            holiday_only=bool(holiday_flag),
+            not_storable=bool(store_flag),
+            interval=interval,
+            cooking_method=utensil,
+            main_ingredient=main_ingredients,
+            category=category,
+        )
+        for name, season, holiday_flag, store_flag, interval, utensil, main_ingredients, category in zip(
+            columns["menu"],
+            columns["season"],
+            columns["holiday_flag"],
+            columns["store_flag"],
+            columns["interval"],
+            columns["utensil"],
+            columns["main_ingredients"],
+            columns["category"],
+            strict=True,
+        )
+    ]
+
+
+def is_valid_household(household: str) -> bool:
+    return re.fullmatch(HOUSEHOLD_PATTERN, household) is not None
+
+
+def with_household(df: pd.DataFrame, household: str = DEFAULT_HOUSEHOLD) -> pd.DataFrame:
+    """``df`` with a household_id column (filled with ``household`` where it is missing)."""
+    if "household_id" not in df:
+        return df.assign(household_id=household)
+    return df.assign(household_id=df["household_id"].fillna(household))
+
+
+def _history_rows(df: pd.DataFrame) -> list[tuple[str, date, str]]:
+    """(household_id, date, menu) rows of ``df``; when a household's date appears more than once the last menu wins."""
+    df = with_household(df)
+    rows = {
+        (household, pd.Timestamp(day).date()): menu for household, day, menu in zip(df["household_id"], df["date"], df["menu"], strict=True)
+    }
+    return [(household, day, menu) for (household, day), menu in rows.items()]
+
+
+def today_in_japan() -> date:
+    return datetime.now(ZoneInfo("Asia/Tokyo")).date()
+
+
+class DishRepository(ABC):
+    """Data source for the dish catalog (main_dish / ingredients) and dish_history.
+
+    The catalog is shared by every household; dish_history rows belong to one household each.
+    """
+
+    def get_recent_menu(self, days: int = HISTORY_DAYS, household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+        """直近 days 日間の household のメニュー名と日付を新しい順に返す."""
+        return self.get_history_since(today_in_japan() - timedelta(days=days), household)
+
+    @abstractmethod
+    def get_history_since(self, since: date, household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+        """since 以降の household のメニュー名と日付を新しい順に返す."""
+
+    @abstractmethod
+    def get_menu_data(self) -> list[Menu]: ...
+
+    @abstractmethod
+    def get_ingredients_data(self) -> pd.DataFrame: ...
+
+    def get_menu_catalog(self) -> MenuCatalog:
+        return MenuCatalog.from_menus(self.get_menu_data())
+
+    def get_ingredient_index(self) -> IngredientIndex:
+        return IngredientIndex(self.get_ingredients_data())
+
+    @abstractmethod
+    def register_dish_history(self, df: pd.DataFrame) -> None:
+        """date, menu (と household_id) 列を持つ DataFrame を dish_history に upsert する.
+
+        household_id 列がない行は DEFAULT_HOUSEHOLD の履歴になる。
+        """
+
+    @abstractmethod
+    def get_table_version(self, table: str) -> str | None:
+        """Cheap change marker of ``table`` (e.g. last-modified time); changes whenever the table is written."""
+
+
+class BigQueryRepository(DishRepository):
+    """Repository on the BigQuery dataset.
+
+    Until the partition-history migration adds household_id to dish_history, every row of the table
+    is read and written as the history of DEFAULT_HOUSEHOLD (other households have none), so a
+    deploy does not depend on the migration having been run.
+    """
+
+    def __init__(self, dataset: str = DATASET):
+        self.dataset = dataset
+        self._household_column = False
+        self._household_column_checked_at: float | None = None
+
+    def _history_columns(self) -> set[str]:
+        with span("bigquery.get_table", table="dish_history"):
+            return {field.name for field in get_bigquery_client().get_table(f"{self.dataset}.dish_history").schema}
+
+    def _has_household_column(self) -> bool:
+        # 列は移行で追加されるだけなので、あると分かった後は確認しない
+        if self._household_column:
+            return True
+        now = time.monotonic()
+        checked_at = self._household_column_checked_at
+        if checked_at is None or now - checked_at >= HOUSEHOLD_COLUMN_RECHECK_SECONDS:
+            self._household_column = "household_id" in self._history_columns()
+            self._household_column_checked_at = now
+        return self._household_column
+
+    def get_history_since(self, since: date, household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+        from google.cloud import bigquery
+
+        query_parameters = [bigquery.ScalarQueryParameter("since", "DATE", since)]
+        if self._has_household_column():
+            household_filter = "household_id = @household AND"
+            query_parameters.append(bigquery.ScalarQueryParameter("household", "STRING", household))
+        elif household == DEFAULT_HOUSEHOLD:
+            # 移行前のテーブルの行はすべて DEFAULT_HOUSEHOLD の履歴
+            household_filter = ""
+        else:
+            return [], []
+
+        # 定数パラメータでの範囲指定なので、パーティション分割されたテーブルでは該当パーティションのみ読む
+        QUERY = f"""
+            SELECT date, menu
+            FROM {self.dataset}.dish_history
+            WHERE {household_filter} date >= @since
+            ORDER BY date desc
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+        columns = fetch_columns(QUERY, job_config, table="dish_history")
+
+        return columns["menu"], columns["date"]
+
+    def get_menu_data(self) -> list[Menu]:
+        QUERY = f"SELECT * FROM {self.dataset}.main_dish"
+        columns = fetch_columns(QUERY, table="main_dish")
+
+        return _menus_from_columns(columns)
+
+    def get_ingredients_data(self) -> pd.DataFrame:
+        QUERY = f"SELECT * FROM {self.dataset}.ingredients"
+        table, _ = fetch_arrow(QUERY, table="ingredients")
+
+        return table.to_pandas()
+
+    def read_table(self, table: str) -> pd.DataFrame:
+        result, _ = fetch_arrow(f"SELECT * FROM {self.dataset}.{table}", table=table)
+        return result.to_pandas()
+
+    def register_dish_history(self, df: pd.DataFrame) -> None:
+        from google.cloud import bigquery
+
+        rows = _history_rows(df)
+        if not rows:
+            return
+
+        if self._has_household_column():
+            household_column, household_value = "household_id, ", "S.household_id, "
+            household_match = "T.household_id = S.household_id AND "
+        elif all(household == DEFAULT_HOUSEHOLD for household, _, _ in rows):
+            household_column = household_value = household_match = ""
+        else:
+            raise ValueError("dish_history has no household_id column yet; run `python -m lib.repository partition-history`")
+
+        # 一時テーブルを使わず、行を配列パラメータとして渡す1回の MERGE で upsert する
+        merge_query = f"""
+        MERGE `{self.dataset}.dish_history` T
+        USING (SELECT {household_column}date, menu FROM UNNEST(@rows)) S
+        ON {household_match}T.date = S.date AND T.date >= @since
+        WHEN MATCHED THEN
+            UPDATE SET T.menu = S.menu
+        WHEN NOT MATCHED THEN
+            INSERT ({household_column}date, menu) VALUES ({household_value}S.date, S.menu)
+        """
+        rows_parameter = bigquery.ArrayQueryParameter(
+            "rows",
+            "STRUCT",
+            [
+                bigquery.StructQueryParameter(
+                    None,
+                    bigquery.ScalarQueryParameter("household_id", "STRING", household),
+                    bigquery.ScalarQueryParameter("date", "DATE", day),
+                    bigquery.ScalarQueryParameter("menu", "STRING", menu),
+                )
+                for household, day, menu in rows
+            ],
+        )
+        # 対象パーティションを絞るため、登録する最も古い日付を定数として渡す
+        since_parameter = bigquery.ScalarQueryParameter("since", "DATE", min(day for _, day, _ in rows))
+        job_config = bigquery.QueryJobConfig(query_parameters=[rows_parameter, since_parameter])
+        with span("bigquery.merge", table="dish_history") as merge_span:
+            query_job = get_bigquery_client().query(merge_query, job_config=job_config)
+            query_job.result()
+            merge_span.set(
+                job_id=query_job.job_id,
+                rows=len(rows),
+                rows_affected=query_job.num_dml_affected_rows,
+                bytes_processed=query_job.total_bytes_processed,
+                bytes_billed=query_job.total_bytes_billed,
+            )
+        inc("bigquery_bytes_billed_total", query_job.total_bytes_billed or 0, table="dish_history")
+
+    def partition_dish_history(self) -> None:
+        """Rewrite dish_history as a month-partitioned table clustered by household and menu (one-off migration).
+
+        A table without household_id gets the column, with every existing row in DEFAULT_HOUSEHOLD.
+        """
+        household_id = "household_id" if "household_id" in self._history_columns() else f"'{DEFAULT_HOUSEHOLD}'"
+        get_bigquery_client().query(PARTITION_DISH_HISTORY_DDL.format(dataset=self.dataset, household_id=household_id)).result()
+
+    def get_table_version(self, table: str) -> str | None:
+        # テーブルのメタデータ取得のみ (クエリは実行しない)
+        with span("bigquery.get_table", table=table):
+            modified = get_bigquery_client().get_table(f"{self.dataset}.{table}").modified
+        return modified.isoformat() if modified else None
+
+
+class SQLiteRepository(DishRepository):
+    """Embedded backend with the same table layout as the BigQuery dataset.
+
+    Used for tests, CI, benchmarks and offline demos. ``path`` may be ``":memory:"``,
+    in which case a single connection is kept for the lifetime of the repository.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS main_dish (
+            menu TEXT PRIMARY KEY,
+            season TEXT,
+            holiday_flag INTEGER,
+            store_flag INTEGER,
+            "interval" INTEGER,
+            utensil TEXT,
+            main_ingredients TEXT,
+            category TEXT
+        );
+        CREATE TABLE IF NOT EXISTS ingredients (
+            menu TEXT,
+            ingredients TEXT,
+            number REAL,
+            units TEXT
+        );
+        CREATE INDEX IF NOT EXISTS ingredients_menu ON ingredients (menu);
+        CREATE TABLE IF NOT EXISTS dish_history (
+            household_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            menu TEXT,
+            PRIMARY KEY (household_id, date)
+        );
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._memory_conn = sqlite3.connect(path, check_same_thread=False) if path == ":memory:" else None
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+            self._migrate_history(conn)
+
+    @staticmethod
+    def _migrate_history(conn: sqlite3.Connection) -> None:
+        """Add household_id to a dish_history created before households (existing rows go to DEFAULT_HOUSEHOLD)."""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(dish_history)")]
+        if "household_id" in columns:
+            return
+        conn.execute("ALTER TABLE dish_history RENAME TO dish_history_old")
+        conn.executescript(SQLiteRepository.SCHEMA)
+        conn.execute("INSERT INTO dish_history (household_id, date, menu) SELECT ?, date, menu FROM dish_history_old", (DEFAULT_HOUSEHOLD,))
+        conn.execute("DROP TABLE dish_history_old")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._memory_conn or sqlite3.connect(self.path)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                if conn is not self._memory_conn:
+                    conn.close()
+
+    def get_history_since(self, since: date, household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT date, menu FROM dish_history WHERE household_id = ? AND date >= ? ORDER BY date DESC",
+                (household, since.isoformat()),
+            ).fetchall()
+
+        menu_list = [menu for _, menu in rows]
+        date_list = [date.fromisoformat(day) for day, _ in rows]
+        return menu_list, date_list
+
+    def get_menu_data(self) -> list[Menu]:
+        with self._connect() as conn:
+            cursor = conn.execute("SELECT * FROM main_dish")
+            names = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+        return _menus_from_columns(columns)
+
+    def get_ingredients_data(self) -> pd.DataFrame:
+        with self._connect() as conn:
+            return pd.read_sql_query("SELECT * FROM ingredients", conn)
+
+    def register_dish_history(self, df: pd.DataFrame) -> None:
+        rows = [(household, day.isoformat(), menu) for household, day, menu in _history_rows(df)]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO dish_history (household_id, date, menu) VALUES (?, ?, ?)"
+                " ON CONFLICT (household_id, date) DO UPDATE SET menu = excluded.menu",
+                rows,
+            )
+            self._bump_versions(conn, "dish_history")
+
+    def load_tables(self, main_dish: pd.DataFrame, ingredients: pd.DataFrame, dish_history: pd.DataFrame | None = None) -> None:
+        """Replace the catalog (and optionally history) with the given frames, using BigQuery column names."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM main_dish")
+            conn.execute("DELETE FROM ingredients")
+            main_dish.to_sql("main_dish", conn, if_exists="append", index=False)
+            ingredients.to_sql("ingredients", conn, if_exists="append", index=False)
+            if dish_history is not None:
+                conn.execute("DELETE FROM dish_history")
+                history = with_household(dish_history)[HISTORY_COLUMNS].assign(
+                    date=lambda d: pd.to_datetime(d["date"]).dt.strftime("%Y-%m-%d")
+                )
+                history.to_sql("dish_history", conn, if_exists="append", index=False)
+                self._bump_versions(conn, "dish_history")
+            self._bump_versions(conn, "main_dish", "ingredients")
+
+    @staticmethod
+    def _bump_versions(conn: sqlite3.Connection, *tables: str) -> None:
+        conn.executemany(
+            "INSERT INTO table_versions (name, version) VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET version = version + 1",
+            [(table,) for table in tables],
+        )
+
+    def get_table_version(self, table: str) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT version FROM table_versions WHERE name = ?", (table,)).fetchone()
+        return str(row[0]) if row else None
+
+
+class DiskCachedRepository(DishRepository):
+    """Keeps the catalog tables of ``source`` in a local TableStore.
+
+    main_dish and ingredients are downloaded again only when the source table version differs
+    from the one stored with the local copy; otherwise the memory-mapped file is used.
+    ``get_menu_catalog`` and ``get_ingredient_index`` build from the mapped Arrow columns without
+    pandas or Menu objects. Only the numeric arrays (the catalog's codes and intervals, the
+    ingredient amounts) stay views of the file; names and ingredient texts are per-process objects.
+    dish_history is small and changes daily, so it is always read from ``source``.
+    """
+
+    def __init__(self, source: DishRepository, directory: str):
+        self.source = source
+        self.store = TableStore(directory)
+        self._checked = threading.local()
+
+    def _source_version(self, table: str) -> str | None:
+        # DatasetCache は get_table_version の直後に読み込むので、そのとき確認したバージョンをもう一度問い合わせずに使う
+        checked: dict[str, tuple[str | None, float]] = getattr(self._checked, "versions", {})
+        version, checked_at = checked.pop(table, (None, -VERSION_REUSE_SECONDS))
+        if time.monotonic() - checked_at < VERSION_REUSE_SECONDS:
+            return version
+        return self.source.get_table_version(table)
+
+    def _load(self, table: str, download: Callable[[], pa.Table]) -> pa.Table:
+        version = self._source_version(table)
+        stored = self.store.read(table)
+        # バージョンが分からないテーブルは手元の内容が最新か判断できないので毎回取得する
+        if stored is not None and version is not None and stored.version == version:
+            inc("disk_cache_requests_total", table=table, result="hit")
+            return stored.table
+
+        with span("disk_cache.download", table=table):
+            result = download()
+            self.store.write(table, result, version)
+        inc("disk_cache_requests_total", table=table, result="miss" if stored is None else "refresh")
+        return result
+
+    def _menu_table(self) -> pa.Table:
+        return self._load("main_dish", lambda: menus_to_table(self.source.get_menu_data()))
+
+    def _ingredients_table(self) -> pa.Table:
+        return self._load(
+            "ingredients", lambda: pa.Table.from_pandas(self.source.get_ingredients_data(), preserve_index=False).sort_by("menu")
+        )
+
+    def get_history_since(self, since: date, household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+        return self.source.get_history_since(since, household)
+
+    def get_menu_data(self) -> list[Menu]:
+        return menus_from_table(self._menu_table())
+
+    def get_menu_catalog(self) -> MenuCatalog:
+        return MenuCatalog.from_table(self._menu_table())
+
+    def get_ingredients_data(self) -> pd.DataFrame:
+        return self._ingredients_table().to_pandas()
+
+    def get_ingredient_index(self) -> IngredientIndex:
+        return IngredientIndex.from_arrow(self._ingredients_table())
+
+    def register_dish_history(self, df: pd.DataFrame) -> None:
+        self.source.register_dish_history(df)
+
+    def get_table_version(self, table: str) -> str | None:
+        version = self.source.get_table_version(table)
+        if not hasattr(self._checked, "versions"):
+            self._checked.versions = {}
+        self._checked.versions[table] = (version, time.monotonic())
+        return version
+
+
+def create_repository(backend: str | None = None) -> DishRepository:
+    """Build the repository selected by ``DISH_BACKEND`` (``bigquery`` or ``sqlite``).
+
+    When ``DISH_DISK_CACHE_DIR`` is set, the catalog tables are cached on disk in that directory.
+    """
+    backend = backend or os.environ.get("DISH_BACKEND", "bigquery")
+    repository: DishRepository
+    if backend == "bigquery":
+        repository = BigQueryRepository()
+    elif backend == "sqlite":
+        repository = SQLiteRepository(os.environ.get("DISH_SQLITE_PATH", "dish.db"))
+    else:
+        raise ValueError(f"Unknown DISH_BACKEND: {backend}")
+
+    if directory := os.environ.get("DISH_DISK_CACHE_DIR"):
+        repository = DiskCachedRepository(repository, directory)
+    return repository
+
+
+def get_repository() -> DishRepository:
+    """Return the process-wide repository, creating it from the environment on first use."""
+    global _repository
+    if _repository is not None:
+        return _repository
+
+    with _repository_lock:
+        if _repository is None:
+            _repository = create_repository()
+    return _repository
+
+
+def set_repository(repository: DishRepository | None) -> None:
+    """Replace the process-wide repository (None resets it to the environment default)."""
+    global _repository
+    with _repository_lock:
+        _repository = repository
+
+
+class HistoryVersions:
+    """Per-household change markers of dish_history that cost one table-metadata lookup to check.
+
+    A household's marker is (the last dish_history version not produced by this process's writes,
+    the number of this process's writes that included the household). ``register`` reads the table
+    version right after its upsert (on the writer thread in write-behind mode) and bumps the markers
+    of the written households; ``version`` takes a change to exactly that version as its own, and
+    any other change (e.g. a registration through another worker) changes every household's marker.
+
+    A write from another worker that lands after our last check but before our own write ends in
+    one of our versions, so it cannot be told apart. Once a change has been taken as our own, every
+    marker therefore also changes ``revalidate_interval`` seconds later.
+    """
+
+    def __init__(self, revalidate_interval: float = HISTORY_REVALIDATE_INTERVAL) -> None:
+        self.revalidate_interval = revalidate_interval
+        self._lock = threading.Lock()
+        self._repository: DishRepository | None = None
+        # 最後に確認したテーブルの版と、自分以外の書き込みで変わった最後の版
+        self._table_version: str | None = None
+        self._external: str | None = None
+        self._writes: dict[str, int] = {}
+        # 自分の書き込みの直後に読んだ版 (まだ version で確認していないもの)
+        self._own_versions: set[str | None] = set()
+        # 自分の書き込みによる変更とみなした最初の時刻 (それ以降、全世帯の版を変えていない)
+        self._absorbed_at: float | None = None
+
+    def _sync_repository(self, repository: DishRepository) -> None:
+        # set_repository でリポジトリが替わったら、それまでの版は使わない
+        if repository is not self._repository:
+            self._repository = repository
+            self._table_version = self._external = None
+            self._writes = {}
+            self._own_versions = set()
+            self._absorbed_at = None
+
+    def version(self, household: str = DEFAULT_HOUSEHOLD) -> Hashable:
+        """Check the table version (metadata only) and return the household's marker."""
+        repository = get_repository()
+        table_version = repository.get_table_version("dish_history")
+        now = time.monotonic()
+        with self._lock:
+            self._sync_repository(repository)
+            if table_version != self._table_version:
+                if table_version in self._own_versions and self._table_version is not None:
+                    if self._absorbed_at is None:
+                        self._absorbed_at = now
+                else:
+                    self._external, self._absorbed_at = table_version, None
+                self._table_version = table_version
+                self._own_versions.clear()
+            if self._absorbed_at is not None and now - self._absorbed_at >= self.revalidate_interval:
+                # 自分の書き込みとみなした変更に、他のワーカーの書き込みが含まれていても取り込む
+                self._external, self._absorbed_at = table_version, None
+            return self._external, self._writes.get(household, 0)
+
+    def current(self, household: str = DEFAULT_HOUSEHOLD) -> Hashable:
+        """The household's marker as of the last check or write, without asking the repository."""
+        with self._lock:
+            return self._external, self._writes.get(household, 0)
+
+    def register(self, df: pd.DataFrame) -> None:
+        """Upsert ``df`` into dish_history, record the version the write produced and bump the markers of its households."""
+        repository = get_repository()
+        repository.register_dish_history(df)
+        written = repository.get_table_version("dish_history")
+        with self._lock:
+            self._sync_repository(repository)
+            self._own_versions.add(written)
+            for household in set(with_household(df)["household_id"]):
+                self._writes[household] = self._writes.get(household, 0) + 1
+
+
+history_versions = HistoryVersions()
+
+
+def export_bigquery_to_sqlite(path: str) -> None:
+    """Copy the BigQuery dataset into a SQLite file for offline use."""
+    source = BigQueryRepository()
+    SQLiteRepository(path).load_tables(
+        source.read_table("main_dish"),
+        source.read_table("ingredients"),
+        source.read_table("dish_history"),
+    )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["partition-history"]:
+        BigQueryRepository().partition_dish_history()
+    else:
+        export_bigquery_to_sqlite(sys.argv[1] if len(sys.argv) > 1 else "dish.db")
@@ -0,0 +1,69 @@
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from lib.ingredients import IngredientIndex
+from lib.util import format_number
+
+
+@dataclass(frozen=True)
+class ShoppingList:
+    """Aggregated ingredients of one or more plans.
+
+    ``totals`` has the columns plan, ingredients, number, units, with one row per
+    (plan, ingredient, unit). ``unconverted`` holds the rows of ingredients whose units could
+    not be converted into each other and are therefore listed more than once within a plan.
+    """
+
+    totals: pd.DataFrame
+    unconverted: pd.DataFrame
+
+    def lines(self, plan: int = 0) -> list[str]:
+        """「材料 分量単位」形式の合計リストを返す."""
+        df = self.totals[self.totals["plan"] == plan]
+        return [
+            f"{ingredient} {format_number(number)}{unit}"
+            for ingredient, number, unit in zip(df["ingredients"], df["number"], df["units"], strict=True)
+        ]
+
+    def unconverted_ingredients(self, plan: int = 0) -> list[str]:
+        return self.unconverted.loc[self.unconverted["plan"] == plan, "ingredients"].unique().tolist()
+
+
+def aggregate_shopping_lists(index: IngredientIndex, plans: Sequence[Iterable[str]]) -> ShoppingList:
+    """Sum the ingredients of every plan (a list of dish names) in a single vectorized pass.
+
+    Quantities are grouped by (plan, ingredient, unit) after converting units to their base
+    unit (e.g. kg → g, 大さじ → ml). Units that have no conversion are kept as they are.
+    """
+    positions_per_plan = [index.positions(plan) for plan in plans]
+    positions = np.concatenate(positions_per_plan) if positions_per_plan else np.empty(0, dtype=np.intp)
+    plan_ids = np.repeat(np.arange(len(positions_per_plan), dtype=np.int64), [len(p) for p in positions_per_plan])
+
+    n_ingredients = len(index.ingredient_names)
+    n_units = len(index.base_unit_names)
+    keys = (plan_ids * n_ingredients + index.ingredient_codes[positions]) * n_units + index.base_unit_codes[positions]
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=index.base_numbers[positions], minlength=len(unique_keys))
+    # 単位換算による浮動小数点の誤差で表示が崩れないように丸める
+    sums = np.round(sums, 6)
+
+    plan, rest = np.divmod(unique_keys, n_ingredients * n_units)
+    ingredient_codes, unit_codes = np.divmod(rest, n_units)
+    totals = pd.DataFrame(
+        {
+            "plan": plan,
+            "ingredients": np.asarray(index.ingredient_names, dtype=object)[ingredient_codes],
+            "number": sums,
+            "units": np.asarray(index.base_unit_names, dtype=object)[unit_codes],
+        }
+    )
+    mixed_units = totals.duplicated(["plan", "ingredients"], keep=False)
+    return ShoppingList(totals=totals, unconverted=totals[mixed_units].reset_index(drop=True))
+
+
+def aggregate_shopping_list(index: IngredientIndex, dishes: Iterable[str]) -> ShoppingList:
+    """1つの献立(料理名のリスト)の材料を合計する."""
+    return aggregate_shopping_lists(index, [dishes])
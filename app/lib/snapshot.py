@@ -0,0 +1,123 @@
+"""Catalog snapshot for fast cold starts.
+
+A snapshot is a TableStore directory holding main_dish and ingredients together with the source
+table versions they were taken at. When ``DISH_SNAPSHOT_DIR`` points to a snapshot,
+``load_snapshot()`` seeds the catalog caches from it at boot, so the first page is served without
+querying the warehouse, and then checks the table versions on a background thread; a table that
+changed since the snapshot is reloaded from the repository as usual.
+
+Setting ``DISH_DISK_CACHE_DIR`` to the same directory keeps the snapshot up to date, since the
+disk cache rewrites the files whenever it downloads a changed table.
+
+uv run python -m lib.snapshot <directory>   # build a snapshot from the current repository
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from lib.cache import ingredient_index_cache, menu_catalog_cache, revalidate_in_background
+from lib.catalog import MenuCatalog
+from lib.ingredients import IngredientIndex
+from lib.metrics import span
+from lib.repository import DishRepository, get_repository
+from lib.table_store import TableStore, menus_from_table, menus_to_table
+from lib.util import Menu
+
+logger = logging.getLogger(__name__)
+
+_loaded = False
+_load_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    menus: list[Menu]
+    ingredients: pd.DataFrame
+    # スナップショット作成時の各テーブルのバージョン (DishRepository.get_table_version)
+    versions: dict[str, str | None]
+    created_at: str
+
+
+def write_snapshot(directory: str | Path, repository: DishRepository | None = None) -> Snapshot:
+    """Take a snapshot of the catalog tables of ``repository`` (default: the process-wide one)."""
+    repository = repository or get_repository()
+    store = TableStore(directory)
+
+    # データより先にバージョンを読み、取得中に更新されても起動後の確認で再読み込みされるようにする
+    versions = {table: repository.get_table_version(table) for table in ("main_dish", "ingredients")}
+    menus = repository.get_menu_data()
+    ingredients = repository.get_ingredients_data()
+    store.write("main_dish", menus_to_table(menus), versions["main_dish"])
+    store.write("ingredients", pa.Table.from_pandas(ingredients, preserve_index=False), versions["ingredients"])
+
+    logger.info("Wrote snapshot of %d dishes and %d ingredient rows to %s", len(menus), len(ingredients), directory)
+    return Snapshot(menus, ingredients, versions, datetime.now().isoformat(timespec="seconds"))
+
+
+def read_snapshot(directory: str | Path) -> Snapshot | None:
+    """Read a snapshot, or return None if ``directory`` does not hold both catalog tables."""
+    store = TableStore(directory)
+    main_dish = store.read("main_dish")
+    ingredients = store.read("ingredients")
+    if main_dish is None or ingredients is None:
+        return None
+
+    return Snapshot(
+        menus_from_table(main_dish.table),
+        ingredients.table.to_pandas(),
+        {"main_dish": main_dish.version, "ingredients": ingredients.version},
+        min(main_dish.written_at, ingredients.written_at),
+    )
+
+
+def load_snapshot(directory: str | Path | None = None) -> bool:
+    """Seed the catalog caches from the snapshot in ``directory`` (default: ``DISH_SNAPSHOT_DIR``) once per process.
+
+    Returns True if the caches were seeded. The table versions are then checked in the background.
+    """
+    global _loaded
+    directory = directory or os.environ.get("DISH_SNAPSHOT_DIR")
+    if _loaded or not directory:
+        return False
+
+    with _load_lock:
+        if _loaded:
+            return False
+        _loaded = True
+
+        with span("snapshot.load") as load_span:
+            start = time.perf_counter()
+            snapshot = read_snapshot(directory)
+            if snapshot is None:
+                return False
+            menu_catalog_cache.seed(MenuCatalog.from_menus(snapshot.menus), snapshot.versions["main_dish"])
+            ingredient_index_cache.seed(IngredientIndex(snapshot.ingredients), snapshot.versions["ingredients"])
+            load_span.set(dishes=len(snapshot.menus), created_at=snapshot.created_at)
+
+    logger.info("Loaded snapshot from %s (created %s) in %.3fs", directory, snapshot.created_at, time.perf_counter() - start)
+    revalidate_in_background(menu_catalog_cache, ingredient_index_cache)
+    return True
+
+
+def reset_snapshot() -> None:
+    """Allow ``load_snapshot`` to run again (for tests)."""
+    global _loaded
+    with _load_lock:
+        _loaded = False
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m lib.snapshot <directory>")
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(write_snapshot(sys.argv[1]).versions, ensure_ascii=False))
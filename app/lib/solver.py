@@ -0,0 +1,145 @@
+import random
+from collections.abc import Iterator, Mapping, Sequence
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class WeeklyConstraints:
+    """Constraints used to build a weekly plan."""
+
+    # 主な食材ごとの1週間の上限回数
+    ingredient_caps: Mapping[str, int] = field(default_factory=lambda: {"海鮮": 2, "牛肉": 2, "豚肉": 3, "鶏肉": 3})
+    # カテゴリごとの1週間の上限回数
+    category_caps: Mapping[str, int] = field(default_factory=lambda: {"カレー・シチュー": 1, "クックドゥ": 1, "鍋": 1})
+    n_days: int = 7
+    # この日(0始まり)以降は保存可能なメニューのみ
+    storable_from_day: int = 2
+    # 週末の休日限定メニュー、storable_from_day より前の日の保存不可メニューの重み
+    holiday_weight: float = 5
+    not_storable_weight: float = 5
+
+
+DEFAULT_WEEKLY_CONSTRAINTS = WeeklyConstraints()
+
+ORDER_HEAD = 64
+
+
+def weighted_order(
+    candidates: Sequence[int] | np.ndarray, weights: Sequence[float] | np.ndarray, rng: random.Random | None = None
+) -> Iterator[int]:
+    """Random permutation of ``candidates`` where each position is drawn proportionally to the weights.
+
+    The first element has the same distribution as ``random.choices(candidates, weights, k=1)``
+    (Efraimidis–Spirakis keys ``u ** (1 / w)``). The keys are drawn with NumPy, seeded from ``rng``
+    (or the ``random`` module), so seeding ``random`` still makes the order reproducible. Only the
+    first ``ORDER_HEAD`` positions are sorted up front; the rest is sorted if the caller gets that far.
+    """
+    seed = (rng or random).getrandbits(64)
+    candidate_array = np.asarray(candidates, dtype=np.intp)
+    keys = -(np.random.default_rng(seed).random(len(candidates)) ** (1.0 / np.asarray(weights, dtype=np.float64)))
+    if len(keys) > ORDER_HEAD:
+        order = np.argpartition(keys, ORDER_HEAD - 1)
+        head, tail = order[:ORDER_HEAD], order[ORDER_HEAD:]
+    else:
+        head, tail = np.arange(len(keys)), np.empty(0, dtype=np.intp)
+    yield from candidate_array[head[np.argsort(keys[head], kind="stable")]].tolist()
+    yield from candidate_array[tail[np.argsort(keys[tail], kind="stable")]].tolist()
+
+
+def solve_plan(
+    day_candidates: Sequence[Sequence[int] | np.ndarray],
+    day_weights: Sequence[Sequence[float] | np.ndarray],
+    ingredient_codes: Sequence[int],
+    ingredient_caps: Sequence[int],
+    category_codes: Sequence[int],
+    category_caps: Sequence[int],
+    rng: random.Random | None = None,
+) -> list[int] | None:
+    """Pick one distinct candidate per day without exceeding the ingredient / category caps.
+
+    Days are filled in order, trying candidates in weighted random order and backtracking on dead
+    ends, so a plan is returned whenever one exists (None otherwise). After each pick the remaining
+    days are checked ahead: every day must still have a usable candidate, and the distinct usable
+    dishes, counted at most up to each ingredient's and each category's remaining cap, must still
+    cover the days left. Candidates that are interchangeable with one that already failed on the
+    same day (same ingredient, category and later days they can go on) are not tried again.
+    """
+    n_days = len(day_candidates)
+    used: set[int] = set()
+    ingredient_counts = [0] * len(ingredient_caps)
+    category_counts = [0] * len(category_caps)
+    plan: list[int] = []
+
+    def usable(candidate: int) -> bool:
+        return (
+            candidate not in used
+            and ingredient_counts[ingredient_codes[candidate]] < ingredient_caps[ingredient_codes[candidate]]
+            and category_counts[category_codes[candidate]] < category_caps[category_codes[candidate]]
+        )
+
+    def look_ahead(day: int) -> bool:
+        # 残りの日で使える候補を集め、食材・カテゴリごとに残りの上限までしか数えない。
+        # どちらの合計も残りの日数に届いたら、以降の日は使える候補が 1 つあるかだけを調べる
+        needed = n_days - day
+        remaining: set[int] = set()
+        ingredient_found: dict[int, int] = {}
+        category_found: dict[int, int] = {}
+        ingredient_total = category_total = 0
+        for candidates in day_candidates[day:]:
+            found = 0
+            for candidate in candidates:
+                if found and ingredient_total >= needed and category_total >= needed:
+                    break
+                if not usable(candidate):
+                    continue
+                found += 1
+                if candidate in remaining:
+                    continue
+                remaining.add(candidate)
+                ingredient, category = ingredient_codes[candidate], category_codes[candidate]
+                ingredient_found[ingredient] = ingredient_found.get(ingredient, 0) + 1
+                if ingredient_found[ingredient] <= ingredient_caps[ingredient] - ingredient_counts[ingredient]:
+                    ingredient_total += 1
+                category_found[category] = category_found.get(category, 0) + 1
+                if category_found[category] <= category_caps[category] - category_counts[category]:
+                    category_total += 1
+            if found == 0:
+                return False
+        return ingredient_total >= needed and category_total >= needed
+
+    day_sets: list[set[int]] = []
+
+    def signature(day: int, candidate: int) -> tuple[int, int, tuple[bool, ...]]:
+        # 食材・カテゴリと、以降のどの日の候補にも入っているかが同じ候補は入れ替えても結果が変わらない
+        if not day_sets:
+            day_sets.extend(set(candidates) for candidates in day_candidates)
+        later = tuple(candidate in day_sets[d] for d in range(day + 1, n_days))
+        return ingredient_codes[candidate], category_codes[candidate], later
+
+    def search(day: int) -> bool:
+        if day == n_days:
+            return True
+        failed: set[tuple[int, int, tuple[bool, ...]]] = set()
+        for candidate in weighted_order(day_candidates[day], day_weights[day], rng):
+            if not usable(candidate):
+                continue
+            if failed and signature(day, candidate) in failed:
+                continue
+            used.add(candidate)
+            ingredient_counts[ingredient_codes[candidate]] += 1
+            category_counts[category_codes[candidate]] += 1
+            plan.append(candidate)
+            if look_ahead(day + 1) and search(day + 1):
+                return True
+            plan.pop()
+            category_counts[category_codes[candidate]] -= 1
+            ingredient_counts[ingredient_codes[candidate]] -= 1
+            used.remove(candidate)
+            failed.add(signature(day, candidate))
+        return False
+
+    if not look_ahead(0) or not search(0):
+        return None
+    return plan
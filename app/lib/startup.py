@@ -0,0 +1,84 @@
+"""Cold-start profiling: time to first render and import time per module.
+
+uv run python -m lib.startup [module ...]   # import time of the page dependencies, slowest first
+"""
+
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from lib.metrics import observe
+
+logger = logging.getLogger(__name__)
+
+# ページスクリプトが読み込むモジュール
+PAGE_MODULES = ["streamlit", "lib.cache", "lib.recipe", "lib.shopping", "lib.snapshot", "lib.suggestion_pool"]
+
+
+def _process_age() -> float:
+    """Seconds since this process was started (Linux), or 0 if it cannot be determined."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+
+
+# プロセスの起動時刻 (取得できない環境ではこのモジュールを読み込んだ時刻)
+_started = time.perf_counter() - _process_age()
+_first_render_seconds: float | None = None
+_lock = threading.Lock()
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+@contextmanager
+def first_render() -> Iterator[None]:
+    """Record the time from process start-up to the end of the first rerun."""
+    try:
+        yield
+    finally:
+        global _first_render_seconds
+        if _first_render_seconds is None:
+            with _lock:
+                if _first_render_seconds is None:
+                    _first_render_seconds = time.perf_counter() - _started
+                    observe("startup_first_render_seconds", _first_render_seconds)
+                    logger.info("First render finished %.3fs after start-up", _first_render_seconds)
+
+
+def get_first_render_seconds() -> float | None:
+    return _first_render_seconds
+
+
+def import_times(modules: list[str]) -> list[tuple[str, int, float, float]]:
+    """Import ``modules`` in a fresh interpreter with ``-X importtime``.
+
+    Returns ``(module, nesting depth, self seconds, cumulative seconds)`` for every module loaded, slowest first.
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if match := _IMPORTTIME_LINE.match(line):
+            times.append((match.group(4), (len(match.group(3)) - 1) // 2, int(match.group(1)) / 1e6, int(match.group(2)) / 1e6))
+    return sorted(times, key=lambda row: row[3], reverse=True)
+
+
+if __name__ == "__main__":
+    MIN_SECONDS = 0.01
+    times = import_times(sys.argv[1:] or PAGE_MODULES)
+    for module, depth, self_seconds, cumulative_seconds in times:
+        if cumulative_seconds >= MIN_SECONDS:
+            print(f"{module:<48} depth={depth:<3} {cumulative_seconds * 1000:9.1f} ms (self {self_seconds * 1000:.1f} ms)")
+    total = sum(cumulative_seconds for _, depth, _, cumulative_seconds in times if depth == 0)
+    print(f"{'total':<58} {total * 1000:9.1f} ms")
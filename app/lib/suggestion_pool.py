@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Generic, TypeVar
+
+from lib.cache import MAX_CACHED_HOUSEHOLDS, fetch_menu_catalog, fetch_recent_menu_list
+from lib.catalog import MenuCatalog
+from lib.metrics import LabelKey, inc, registry
+from lib.preference import get_preference_weights
+from lib.recipe import RECENT_MENU_LIMIT, get_todays_dish, get_weekly_dish
+from lib.repository import DEFAULT_HOUSEHOLD, today_in_japan
+from lib.util import Menu
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# プールごとに用意しておく提案の数 (0 のときは毎回その場で生成する)
+POOL_SIZE = int(os.environ.get("DISH_SUGGESTION_POOL_SIZE", "16"))
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    generated: int = 0
+    # 日付・直近の履歴・カタログが変わってプールを作り直した回数
+    rebuilds: int = 0
+    # 世帯数の上限を超えて捨てた世帯の数
+    evictions: int = 0
+    generation_seconds: float = 0.0
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    @property
+    def refill_rate(self) -> float:
+        """Suggestions generated per second of background work."""
+        return self.generated / self.generation_seconds if self.generation_seconds else 0.0
+
+
+@dataclass
+class _Slot(Generic[T]):
+    """Suggestions of one household for one set of inputs."""
+
+    key: tuple
+    # 提案する日 (日本時間の今日)。生成にもこの日付を渡す
+    day: date
+    catalog: MenuCatalog
+    recent_menu: list[str]
+    items: deque[T] = field(default_factory=deque)
+    # 生成に失敗した (制約を満たす提案がないなど)。入力が変わるまで再試行しない
+    failed: bool = False
+
+
+class SuggestionPool(Generic[T]):
+    """Suggestions generated ahead of time by a background thread.
+
+    Each household has its own slot, tied to one set of inputs: the date to suggest for (default:
+    today in Japan), the catalog object and the household's recent menu. Suggestions are generated
+    for that date. ``pop`` returns a ready suggestion in O(1) when the inputs are unchanged;
+    otherwise the slot is emptied and refilled for the new inputs, and that call generates its
+    suggestion directly. Slots of at most ``max_households`` households are kept
+    (least recently used dropped first), and the most recently used slots are refilled first.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        generate: Callable[[MenuCatalog, list[str], str, date], T],
+        size: int = POOL_SIZE,
+        max_households: int = MAX_CACHED_HOUSEHOLDS,
+    ):
+        self.name = name
+        self.generate = generate
+        self.size = size
+        self.max_households = max_households
+        self.stats = PoolStats()
+        self._slots: OrderedDict[str, _Slot[T]] = OrderedDict()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        with self._condition:
+            return sum(len(slot.items) for slot in self._slots.values())
+
+    def _set_inputs(self, catalog: MenuCatalog, recent_menu: list[str], household: str, today: date | None) -> _Slot[T]:
+        day = today or today_in_japan()
+        key = (day, id(catalog), tuple(recent_menu))
+        slot = self._slots.get(household)
+        if slot is None or key != slot.key:
+            # slot が catalog を保持しているので、id が別のカタログに再利用されることはない
+            slot = self._slots[household] = _Slot(key, day, catalog, list(recent_menu))
+            self.stats.rebuilds += 1
+        self._slots.move_to_end(household)
+        if len(self._slots) > self.max_households:
+            self._slots.popitem(last=False)
+            self.stats.evictions += 1
+        if self.size > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"suggestion-pool-{self.name}", daemon=True)
+            self._thread.start()
+        self._condition.notify()
+        return slot
+
+    def prime(self, catalog: MenuCatalog, recent_menu: list[str], household: str = DEFAULT_HOUSEHOLD, today: date | None = None) -> None:
+        """Start filling the household's slot for these inputs without taking a suggestion."""
+        with self._condition:
+            self._set_inputs(catalog, recent_menu, household, today)
+
+    def pop(self, catalog: MenuCatalog, recent_menu: list[str], household: str = DEFAULT_HOUSEHOLD, today: date | None = None) -> T:
+        """Take a suggestion for ``today`` (default: today in Japan)."""
+        with self._condition:
+            slot = self._set_inputs(catalog, recent_menu, household, today)
+            if slot.items:
+                self.stats.hits += 1
+                inc("suggestion_pool_requests_total", pool=self.name, result="hit")
+                return slot.items.popleft()
+            self.stats.misses += 1
+        inc("suggestion_pool_requests_total", pool=self.name, result="miss")
+        return self.generate(catalog, list(recent_menu), household, slot.day)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _next_slot(self) -> tuple[str, _Slot[T]] | None:
+        """The most recently used slot that needs another suggestion."""
+        for household, slot in reversed(self._slots.items()):
+            if not slot.failed and len(slot.items) < self.size:
+                return household, slot
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed and (target := self._next_slot()) is None:
+                    self._condition.wait()
+                if self._closed or target is None:
+                    return
+            household, slot = target
+
+            start = time.perf_counter()
+            try:
+                item = self.generate(slot.catalog, list(slot.recent_menu), household, slot.day)
+            except Exception:
+                logger.exception("Failed to generate a %s suggestion", self.name)
+                with self._condition:
+                    slot.failed = True
+                continue
+
+            with self._condition:
+                self.stats.generated += 1
+                self.stats.generation_seconds += time.perf_counter() - start
+                # 生成中に入力が変わった (slot が作り直された・捨てられた) 場合は捨てる
+                if self._slots.get(household) is slot:
+                    slot.items.append(item)
+
+
+def suggest_todays_dish(catalog: MenuCatalog, recent_menu: list[str], household: str, today: date) -> Menu:
+    return get_todays_dish(catalog, recent_menu, get_preference_weights(catalog, household), today)
+
+
+def suggest_weekly_dish(catalog: MenuCatalog, recent_menu: list[str], household: str, today: date) -> list[Menu]:
+    return get_weekly_dish(catalog, recent_menu, preference=get_preference_weights(catalog, household), start=today)
+
+
+daily_suggestion_pool = SuggestionPool("daily", suggest_todays_dish)
+weekly_suggestion_pool = SuggestionPool("weekly", suggest_weekly_dish)
+POOLS: list[SuggestionPool] = [daily_suggestion_pool, weekly_suggestion_pool]
+
+
+def prime_suggestion_pools(household: str = DEFAULT_HOUSEHOLD) -> None:
+    """Refill every pool for the current catalog and the household's recent menu (e.g. right after registering history)."""
+    catalog = fetch_menu_catalog()
+    recent_menu = fetch_recent_menu_list(household)[0][:RECENT_MENU_LIMIT]
+    for pool in POOLS:
+        pool.prime(catalog, recent_menu, household)
+
+
+def get_pool_stats() -> dict[str, PoolStats]:
+    return {pool.name: pool.stats for pool in POOLS}
+
+
+def _pool_gauges() -> dict[tuple[str, LabelKey], float]:
+    gauges: dict[tuple[str, LabelKey], float] = {}
+    for pool in POOLS:
+        labels = (("pool", pool.name),)
+        gauges["suggestion_pool_size", labels] = float(len(pool))
+        gauges["suggestion_pool_hit_ratio", labels] = pool.stats.hit_ratio
+        gauges["suggestion_pool_refill_rate", labels] = pool.stats.refill_rate
+        gauges["suggestion_pool_rebuilds", labels] = float(pool.stats.rebuilds)
+        gauges["suggestion_pool_households", labels] = float(len(pool._slots))
+    return gauges
+
+
+registry.add_collector(_pool_gauges)
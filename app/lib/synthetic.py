@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from lib.repository import SQLiteRepository, today_in_japan
+
+# 実データに近い分布 (値, 出現確率)
+SEASONS = (["通年", "夏", "冬"], [0.8, 0.1, 0.1])
+UTENSILS = (["ホットクック", "フライパン", "鍋", "オーブン", "電子レンジ"], [0.35, 0.35, 0.15, 0.1, 0.05])
+MAIN_INGREDIENTS = (["鶏肉", "豚肉", "牛肉", "海鮮", "ひき肉", "卵", "豆腐"], [0.25, 0.25, 0.12, 0.15, 0.12, 0.06, 0.05])
+CATEGORIES = ([None, "カレー・シチュー", "クックドゥ", "鍋"], [0.85, 0.05, 0.05, 0.05])
+UNITS = (["g", "kg", "ml", "大さじ", "小さじ", "個", "本", "枚", "パック"], [0.35, 0.03, 0.1, 0.12, 0.1, 0.12, 0.08, 0.05, 0.05])
+HOLIDAY_RATE = 0.1
+NOT_STORABLE_RATE = 0.3
+N_INGREDIENT_NAMES = 300
+
+
+@dataclass(frozen=True)
+class SyntheticDataset:
+    """Tables with the same columns as the BigQuery dataset."""
+
+    main_dish: pd.DataFrame
+    ingredients: pd.DataFrame
+    dish_history: pd.DataFrame
+
+    def to_repository(self, path: str = ":memory:") -> SQLiteRepository:
+        repository = SQLiteRepository(path)
+        repository.load_tables(self.main_dish, self.ingredients, self.dish_history)
+        return repository
+
+
+def _choice(rng: np.random.Generator, values_and_probabilities: tuple[list, list[float]], size: int) -> np.ndarray:
+    values, probabilities = values_and_probabilities
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=size, p=probabilities)]
+
+
+def generate_dataset(
+    n_dishes: int,
+    history_days: int = 365,
+    ingredients_per_dish: tuple[int, int] = (3, 8),
+    end: date | None = None,
+    seed: int = 0,
+) -> SyntheticDataset:
+    """Generate a synthetic catalog of ``n_dishes`` dishes and ``history_days`` days of history ending at ``end`` (today in Japan)."""
+    rng = np.random.default_rng(seed)
+    end = end or today_in_japan()
+    names = np.array([f"料理{i:06d}" for i in range(n_dishes)], dtype=object)
+
+    main_dish = pd.DataFrame(
+        {
+            "menu": names,
+            "season": _choice(rng, SEASONS, n_dishes),
+            "holiday_flag": rng.random(n_dishes) < HOLIDAY_RATE,
+            "store_flag": rng.random(n_dishes) < NOT_STORABLE_RATE,
+            "interval": rng.integers(7, 29, size=n_dishes),
+            "utensil": _choice(rng, UTENSILS, n_dishes),
+            "main_ingredients": _choice(rng, MAIN_INGREDIENTS, n_dishes),
+            "category": _choice(rng, CATEGORIES, n_dishes),
+        }
+    )
+
+    low, high = ingredients_per_dish
+    counts = rng.integers(low, high + 1, size=n_dishes)
+    n_rows = int(counts.sum())
+    units = _choice(rng, UNITS, n_rows)
+    by_weight = np.isin(units, ["g", "ml"])
+    numbers = np.where(by_weight, rng.integers(1, 41, size=n_rows) * 10, rng.integers(1, 5, size=n_rows)).astype(np.float64)
+    ingredients = pd.DataFrame(
+        {
+            "menu": np.repeat(names, counts),
+            "ingredients": np.char.add("食材", rng.integers(0, N_INGREDIENT_NAMES, size=n_rows).astype(str)).astype(object),
+            "number": numbers,
+            "units": units,
+        }
+    )
+
+    dish_history = pd.DataFrame(
+        {
+            "date": [end - timedelta(days=i) for i in range(history_days)],
+            "menu": names[rng.integers(0, n_dishes, size=history_days)] if n_dishes else [],
+        }
+    )
+    return SyntheticDataset(main_dish=main_dish, ingredients=ingredients, dish_history=dish_history)
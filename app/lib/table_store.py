@@ -0,0 +1,91 @@
+"""Arrow IPC files of the catalog tables, each tagged with the version of its source table.
+
+Files are read through a memory map, so worker processes on one host read the same pages from
+the OS page cache instead of each downloading the table. A write goes to a temporary file that
+then atomically replaces the old one, so readers never see a partially written table.
+"""
+
+import json
+import os
+import tempfile
+from dataclasses import dataclass, fields
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow as pa
+
+from lib.util import Menu
+
+FORMAT = "1"
+_FORMAT_KEY = b"dish.format"
+_VERSION_KEY = b"dish.source_version"
+_WRITTEN_AT_KEY = b"dish.written_at"
+
+
+@dataclass(frozen=True)
+class StoredTable:
+    table: pa.Table
+    # 保存時のソーステーブルのバージョン (DishRepository.get_table_version)
+    version: str | None
+    written_at: str
+
+
+class TableStore:
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+
+    def path(self, name: str) -> Path:
+        return self.directory / f"{name}.arrow"
+
+    def read(self, name: str) -> StoredTable | None:
+        """Map the stored table, or return None if it is missing or was written in another format."""
+        try:
+            with pa.memory_map(str(self.path(name)), "r") as source:
+                reader = pa.ipc.open_file(source)
+                metadata = reader.schema.metadata or {}
+                if metadata.get(_FORMAT_KEY) != FORMAT.encode():
+                    return None
+                table = reader.read_all()
+        except FileNotFoundError:
+            return None
+        return StoredTable(table, json.loads(metadata[_VERSION_KEY]), metadata[_WRITTEN_AT_KEY].decode())
+
+    def write(self, name: str, table: pa.Table, version: str | None) -> None:
+        metadata = {
+            _FORMAT_KEY: FORMAT.encode(),
+            _VERSION_KEY: json.dumps(version).encode(),
+            _WRITTEN_AT_KEY: datetime.now().isoformat(timespec="seconds").encode(),
+        }
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, prefix=f".{name}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            with pa.OSFile(temporary_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(temporary_path, self.path(name))
+        except BaseException:
+            Path(temporary_path).unlink(missing_ok=True)
+            raise
+
+
+# MenuCatalog が整数コードで持つ列 (辞書符号化して保存し、from_table がインデックスをそのまま使う)
+CODED_MENU_COLUMNS = ("season", "cooking_method", "main_ingredient", "category")
+
+
+def menus_to_table(menus: list[Menu]) -> pa.Table:
+    columns = {}
+    for field in fields(Menu):
+        values = [getattr(menu, field.name) for menu in menus]
+        if field.name in CODED_MENU_COLUMNS:
+            # None (カテゴリなし) も辞書の値にして、インデックスに null を含めない
+            columns[field.name] = pa.array(values, type=pa.string()).dictionary_encode(null_encoding="encode")
+        else:
+            columns[field.name] = values
+    return pa.Table.from_pydict(columns)
+
+
+def menus_from_table(table: pa.Table) -> list[Menu]:
+    columns = table.select([field.name for field in fields(Menu)]).to_pydict()
+    return [Menu(*values) for values in zip(*columns.values(), strict=True)]
@@ -1,14 +1,34 @@
 import base64
 import json
+import logging
 import os
+import threading
+import time
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
 
 from dotenv import load_dotenv
-from google.cloud import bigquery
-from google.oauth2 import service_account
 
+from lib.metrics import span
 
-@dataclass
+# google-cloud-bigquery と google-auth は import に時間がかかるため、クライアントを作るときに読み込む
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+    from google.oauth2 import service_account
+
+logger = logging.getLogger(__name__)
+
+BIGQUERY_SCOPES = ["https://www.googleapis.com/auth/bigquery", "https://www.googleapis.com/auth/drive"]
+HTTP_POOL_SIZE = 16
+
+_client: "bigquery.Client | None" = None
+_client_lock = threading.Lock()
+_client_init_seconds: float | None = None
+_credentials: "service_account.Credentials | None" = None
+_bqstorage_client: Any = None
+
+
+@dataclass(frozen=True, slots=True)
 class Menu:
     name: str
     season: str
@@ -24,14 +44,77 @@ def format_number(num: float) -> int | float:
     return int(num) if num.is_integer() else num
 
 
-def get_bigquery_client() -> bigquery.Client:
+def _load_credentials() -> "service_account.Credentials":
+    from google.oauth2 import service_account
+
     load_dotenv()
     encoded_secrets = os.environ["GCP_SA_CREDENTIAL"]
     decoded_secrets = base64.b64decode(encoded_secrets).decode("utf-8")
     secrets = json.loads(decoded_secrets, strict=False)
 
-    scopes = ["https://www.googleapis.com/auth/bigquery", "https://www.googleapis.com/auth/drive"]
-    credentials = service_account.Credentials.from_service_account_info(secrets, scopes=scopes)
-    client = bigquery.Client(credentials=credentials, project=credentials.project_id)
+    return service_account.Credentials.from_service_account_info(secrets, scopes=BIGQUERY_SCOPES)
+
+
+def _create_bigquery_client(credentials: "service_account.Credentials") -> "bigquery.Client":
+    from google.auth.transport.requests import AuthorizedSession
+    from google.cloud import bigquery
+    from requests.adapters import HTTPAdapter
+
+    # AuthorizedSession はトークン期限切れ時に自動でリフレッシュし、コネクションプールを使い回す
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+
+    return bigquery.Client(credentials=credentials, project=credentials.project_id, _http=session)
+
+
+def get_bigquery_client() -> "bigquery.Client":
+    """Return the process-wide BigQuery client, creating it on first use."""
+    global _client, _client_init_seconds, _credentials
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            start = time.perf_counter()
+            with span("bigquery.client_init"):
+                _credentials = _load_credentials()
+                _client = _create_bigquery_client(_credentials)
+            _client_init_seconds = time.perf_counter() - start
+            logger.info("BigQuery client created in %.3fs", _client_init_seconds)
+    return _client
+
+
+def get_bqstorage_client() -> Any:
+    """Return a shared BigQuery Storage read client, or None when google-cloud-bigquery-storage is not installed."""
+    global _bqstorage_client
+    if _bqstorage_client is not None:
+        return _bqstorage_client
+
+    try:
+        from google.cloud import bigquery_storage  # type: ignore[attr-defined]
+    except ImportError:
+        return None
+
+    get_bigquery_client()
+    with _client_lock:
+        if _bqstorage_client is None:
+            _bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=_credentials)
+    return _bqstorage_client
+
+
+def get_bigquery_client_init_seconds() -> float | None:
+    """Seconds spent creating the shared client, or None if it has not been created yet."""
+    return _client_init_seconds
+
 
-    return client
+def reset_bigquery_client() -> None:
+    """Drop the shared client so the next call builds a new one (e.g. after rotating credentials)."""
+    global _client, _client_init_seconds, _credentials, _bqstorage_client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _client_init_seconds = None
+        _credentials = None
+        _bqstorage_client = None
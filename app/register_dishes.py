@@ -3,9 +3,18 @@ from zoneinfo import ZoneInfo
 
 import pandas as pd
 import streamlit as st
-from lib.cache import fetch_menu_data, fetch_recent_menu_list
+from lib.cache import (
+    apply_registered_history,
+    fetch_menu_catalog,
+    fetch_recent_menu_list,
+    menu_catalog_cache,
+    prefetch,
+    recent_menu_caches,
+)
+from lib.catalog import MenuCatalog
 from lib.recipe import register_dish_history
-from lib.util import Menu
+from lib.repository import DEFAULT_HOUSEHOLD
+from lib.suggestion_pool import prime_suggestion_pools
 
 # Title and header
 st.title("食べた主菜を登録")
@@ -16,10 +25,20 @@ def generate_recent_dates() -> list[datetime]:
     return [today - timedelta(days=i) for i in range(3)]
 
 
+# 履歴・提案は世帯ごと (app.py が URL から設定する)
+household: str = st.session_state.get("household", DEFAULT_HOUSEHOLD)
+
+# 前回の登録を書き込みキューに積んだ場合は、その書き込みが最終的に失敗していないか確認する
+pending_write = st.session_state.get("pending_history_write")
+if pending_write is not None and pending_write.done():
+    del st.session_state["pending_history_write"]
+    if pending_write.exception() is not None:
+        st.error("前回のメニューの登録を保存できませんでした。もう一度登録してください。")
+
 # Load menu data
-dishes: list[Menu] = fetch_menu_data()
-dish_list = [dish.name for dish in dishes]
-recent_menu_list, date_list = fetch_recent_menu_list()
+prefetch(menu_catalog_cache, recent_menu_caches[household])
+dishes: MenuCatalog = fetch_menu_catalog()
+recent_menu_list, date_list = fetch_recent_menu_list(household)
 
 # Generate recent dates
 dates = generate_recent_dates()
@@ -41,12 +60,8 @@ with st.form(key="dish_registration_form"):
             # Allow user to select a dish
             st.session_state.day_to_register_dish[date_key] = st.selectbox(
                 "主菜",
-                options=[""] + dish_list,
-                index=(
-                    dish_list.index(st.session_state.day_to_register_dish[date_key]) + 1
-                    if st.session_state.day_to_register_dish[date_key]
-                    else 0
-                ),
+                options=dishes.options,
+                index=dishes.option_index(st.session_state.day_to_register_dish[date_key]),
                 key=f"dish_{date_key}",
             )
     register_dishes = st.form_submit_button("メニューを登録する")
@@ -58,11 +73,14 @@ if register_dishes:
     if len(data) > 0:
         df = pd.DataFrame(data)
         df["date"] = pd.to_datetime(df["date"]).dt.date
-        register_dish_history(df)
+        pending_write = register_dish_history(df, household)
 
         st.success("メニューが登録されました！")
-        fetch_recent_menu_list.clear()  # type: ignore
-        recent_menu_list, date_list = fetch_recent_menu_list()
+        apply_registered_history(df, household, pending_write)
+        if pending_write is not None:
+            st.session_state["pending_history_write"] = pending_write
+        prime_suggestion_pools(household)
+        recent_menu_list, date_list = fetch_recent_menu_list(household)
     else:
         st.warning("登録するメニューが選択されていません。")
 
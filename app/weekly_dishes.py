@@ -1,11 +1,22 @@
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
-import pandas as pd
 import streamlit as st
-from lib.cache import fetch_ingredients_data, fetch_menu_data, fetch_recent_menu_list
-from lib.recipe import get_weekly_dish
-from lib.util import Menu, format_number
+from lib.cache import (
+    fetch_ingredient_index,
+    fetch_menu_catalog,
+    fetch_recent_menu_list,
+    ingredient_index_cache,
+    menu_catalog_cache,
+    prefetch,
+    recent_menu_caches,
+)
+from lib.catalog import MenuCatalog
+from lib.ingredients import IngredientIndex
+from lib.recipe import RECENT_MENU_LIMIT
+from lib.repository import DEFAULT_HOUSEHOLD, today_in_japan
+from lib.shopping import aggregate_shopping_list
+from lib.suggestion_pool import weekly_suggestion_pool
 
 # Title and header
 st.title("今週の主菜")
@@ -17,12 +28,15 @@ def generate_week_dates() -> list[str]:
     return [(today + timedelta(days=i)).strftime("%m/%d(%a)") for i in range(7)]
 
 
+# 履歴・提案は世帯ごと (app.py が URL から設定する)
+household: str = st.session_state.get("household", DEFAULT_HOUSEHOLD)
+
 # Load data
-dishes: list[Menu] = fetch_menu_data()
-dish_list = [dish.name for dish in dishes]
+prefetch(menu_catalog_cache, ingredient_index_cache, recent_menu_caches[household])
+dishes: MenuCatalog = fetch_menu_catalog()
 
-df_ingredients: pd.DataFrame = fetch_ingredients_data()
-recent_menu: list[str] = fetch_recent_menu_list()[0][:7]
+ingredient_index: IngredientIndex = fetch_ingredient_index()
+recent_menu: list[str] = fetch_recent_menu_list(household)[0][:RECENT_MENU_LIMIT]
 
 dates = generate_week_dates()
 
@@ -30,41 +44,57 @@ dates = generate_week_dates()
 if "day_to_dish" not in st.session_state:
     st.session_state.day_to_dish = {date: "" for date in dates}
 
-# Suggest dishes button
-if st.button("主菜リストを提案する"):
-    weekly_dishes = get_weekly_dish(dishes, recent_menu)
-    weekly_dishes_name = [dish.name for dish in weekly_dishes]
-    st.session_state.day_to_dish = {date: dish for date, dish in zip(dates, weekly_dishes_name, strict=False)}
-
-# User input for each day
-st.write("### 1週間分の主菜を選択")
-with st.form(key="dish_selection_form"):
-    for date in dates:
-        st.session_state.day_to_dish[date] = st.selectbox(
-            f"{date} の主菜を選択",
-            options=[""] + dish_list,
-            index=(dish_list.index(st.session_state.day_to_dish[date]) + 1 if st.session_state.day_to_dish[date] else 0),
-            key=date,
-        )
-    show_ingredients = st.form_submit_button("材料を表示する")
-
-if show_ingredients:
+# 提案・選択フォーム・材料リストを1つの st.fragment にまとめ、操作してもデータの読み込みは再実行しない
+
+
+def suggestion() -> None:
+    # 提案はバックグラウンドで用意しておいたものを取り出す
+    # 表示する日付と同じく、日本時間の今日からの1週間を提案する
+    today = today_in_japan()
+    weekly_suggestion_pool.prime(dishes, recent_menu, household, today)
+    if st.button("主菜リストを提案する"):
+        weekly_dishes = weekly_suggestion_pool.pop(dishes, recent_menu, household, today)
+        weekly_dishes_name = [dish.name for dish in weekly_dishes]
+        st.session_state.day_to_dish = {date: dish for date, dish in zip(dates, weekly_dishes_name, strict=False)}
+        # 選択フォームはこの後に描画するので、各 selectbox の値を書き換えるだけで提案が反映される
+        for date, dish in st.session_state.day_to_dish.items():
+            st.session_state[date] = dish
+
+
+def ingredient_list(day_to_dish: dict[str, str]) -> None:
     st.write("### 材料リスト")
+    # 材料のテキストはメニューごとに作成済みのものを使う
+    st.text("".join(f"{day}: {dish}\n{ingredient_index.text_for(dish)}\n\n" for day, dish in day_to_dish.items()))
 
-    display_ingredients: str = ""
-    df_target_accum = pd.DataFrame()
-    for day, dish in st.session_state.day_to_dish.items():
-        display_ingredients += f"{day}: {dish}"
-        df_target = df_ingredients[df_ingredients["menu"] == dish]
-        df_target_accum = pd.concat([df_target_accum, df_target], ignore_index=True)
-        ingredients = [f"{row['ingredients']} {format_number(row['number'])}{row['units']}" for _, row in df_target.iterrows()]
-        display_ingredients += "\n" + "\n".join(ingredients)
-        display_ingredients += "\n\n"
-    st.text(display_ingredients)
 
+def totals(day_to_dish: dict[str, str]) -> None:
     st.write("### 材料リスト(合計)")
-    df_target_accum = df_target_accum.groupby("ingredients").agg({"number": "sum", "units": "first"}).reset_index()
-    ingredients = [f"{row['ingredients']} {format_number(row['number'])}{row['units']}" for _, row in df_target_accum.iterrows()]
-    st.text("\n".join(ingredients))
-else:
-    st.write("\n")
+    shopping_list = aggregate_shopping_list(ingredient_index, day_to_dish.values())
+    st.text("\n".join(shopping_list.lines()))
+    if unconverted := shopping_list.unconverted_ingredients():
+        st.caption(f"単位を換算できないため別々に集計した材料: {', '.join(unconverted)}")
+
+
+def selection_form() -> bool:
+    # User input for each day
+    st.write("### 1週間分の主菜を選択")
+    with st.form(key="dish_selection_form"):
+        for date in dates:
+            # selectbox の値は key で保持する (提案はこの値を書き換える)
+            if date not in st.session_state:
+                st.session_state[date] = st.session_state.day_to_dish[date]
+            st.session_state.day_to_dish[date] = st.selectbox(f"{date} の主菜を選択", options=dishes.options, key=date)
+        return st.form_submit_button("材料を表示する")
+
+
+@st.fragment
+def weekly_planner() -> None:
+    suggestion()
+    if selection_form():
+        ingredient_list(st.session_state.day_to_dish)
+        totals(st.session_state.day_to_dish)
+    else:
+        st.write("\n")
+
+
+weekly_planner()
@@ -0,0 +1,258 @@
+"""Load test of the API flows against a local instance, with an in-process stand-in for BigQuery.
+
+uv run python benchmarks/load_test.py --users 32 --duration 30 --query-latency 0.3 --write-latency 1.0
+uv run python benchmarks/load_test.py --url http://localhost:8000  # an instance that is already running
+
+By default the API (app/api.py) is started in this process on a free port, on top of a synthetic
+catalog in SQLite wrapped by LatencyRepository, which sleeps for the given latencies like a remote
+warehouse would. Each simulated user loops over the suggest-week, suggest-today, show-ingredients
+and register flows (in --mix proportions) for --duration seconds. Throughput and p50/p95/p99
+latency per flow are printed and saved as JSON (benchmarks/results/load-<timestamp>.json) with the
+commit and the DISH_* settings, so runs can be compared across commits.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from lib.repository import DEFAULT_HOUSEHOLD, DishRepository, set_repository, today_in_japan  # noqa: E402
+from lib.synthetic import generate_dataset  # noqa: E402
+from lib.util import Menu  # noqa: E402
+from run_benchmarks import git_commit  # noqa: E402
+
+FLOWS = ["suggest_week", "suggest_today", "show_ingredients", "register"]
+DEFAULT_MIX = "suggest_week=3,suggest_today=3,show_ingredients=3,register=1"
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyRepository(DishRepository):
+    """Wraps ``source`` and sleeps before each call, standing in for the round trips to BigQuery."""
+
+    def __init__(self, source: DishRepository, query_latency: float, write_latency: float, metadata_latency: float):
+        self.source = source
+        self.query_latency = query_latency
+        self.write_latency = write_latency
+        self.metadata_latency = metadata_latency
+
+    def get_history_since(self, since: date, household: str = DEFAULT_HOUSEHOLD) -> tuple[list[str], list[date]]:
+        time.sleep(self.query_latency)
+        return self.source.get_history_since(since, household)
+
+    def get_menu_data(self) -> list[Menu]:
+        time.sleep(self.query_latency)
+        return self.source.get_menu_data()
+
+    def get_ingredients_data(self) -> pd.DataFrame:
+        time.sleep(self.query_latency)
+        return self.source.get_ingredients_data()
+
+    def register_dish_history(self, df: pd.DataFrame) -> None:
+        time.sleep(self.write_latency)
+        self.source.register_dish_history(df)
+
+    def get_table_version(self, table: str) -> str | None:
+        time.sleep(self.metadata_latency)
+        return self.source.get_table_version(table)
+
+
+@dataclass
+class FlowResult:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {name: float(weight) for name, weight in (item.split("=") for item in mix.split(","))}
+    if unknown := set(weights) - set(FLOWS):
+        raise ValueError(f"Unknown flows: {', '.join(sorted(unknown))}")
+    return weights
+
+
+Flow = Callable[[], requests.Response]
+
+
+def build_flows(session: requests.Session, base_url: str, household: str, dish_names: list[str]) -> dict[str, Flow]:
+    params = {"household": household}
+
+    def show_ingredients() -> requests.Response:
+        return session.post(f"{base_url}/ingredients", json={"dishes": random.sample(dish_names, min(7, len(dish_names)))})
+
+    def register() -> requests.Response:
+        day = today_in_japan() - timedelta(days=random.randrange(3))
+        entry = {"date": day.isoformat(), "menu": random.choice(dish_names)}
+        return session.post(f"{base_url}/history", params=params, json={"entries": [entry]})
+
+    return {
+        "suggest_week": lambda: session.get(f"{base_url}/suggest/week", params=params),
+        "suggest_today": lambda: session.get(f"{base_url}/suggest/today", params=params),
+        "show_ingredients": show_ingredients,
+        "register": register,
+    }
+
+
+def run_user(
+    base_url: str, household: str, dish_names: list[str], mix: dict[str, float], deadline: float, results: dict[str, FlowResult]
+) -> None:
+    with requests.Session() as session:
+        flows = build_flows(session, base_url, household, dish_names)
+        names, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = flows[name]().ok
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            # 結果の dict は各ユーザー専用なのでロックは不要
+            if ok:
+                results[name].latencies.append(elapsed)
+            else:
+                results[name].errors += 1
+
+
+def summarize(name: str, result: FlowResult, duration: float) -> dict:
+    requests_ok = len(result.latencies)
+    summary: dict = {"flow": name, "requests": requests_ok, "errors": result.errors, "throughput": requests_ok / duration}
+    if result.latencies:
+        latencies = np.asarray(result.latencies)
+        summary |= {f"p{p}": float(np.percentile(latencies, p)) for p in PERCENTILES}
+        summary |= {"mean": float(latencies.mean()), "max": float(latencies.max())}
+    return summary
+
+
+def household_of(user: int, households: int) -> str:
+    """Household of a simulated user (all users share DEFAULT_HOUSEHOLD when there is one household)."""
+    return f"load-{user % households}" if households > 1 else DEFAULT_HOUSEHOLD
+
+
+def discover_dish_names(base_url: str, rounds: int = 5) -> list[str]:
+    """Dish names to use in the ingredient and register flows, collected from weekly suggestions (also warms the instance up)."""
+    names: set[str] = set()
+    for _ in range(rounds):
+        response = requests.get(f"{base_url}/suggest/week")
+        response.raise_for_status()
+        names.update(day["dish"]["name"] for day in response.json()["days"])
+    return sorted(names)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_local_api(args: argparse.Namespace) -> tuple[str, Callable[[], None]]:
+    """Serve app/api.py in a background thread on top of the latency-injecting stand-in."""
+    import uvicorn
+
+    dataset = generate_dataset(args.dishes, history_days=args.history_days, seed=args.seed)
+    set_repository(LatencyRepository(dataset.to_repository(), args.query_latency, args.write_latency, args.metadata_latency))
+
+    from api import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="load-test-api", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("The local API failed to start")
+        time.sleep(0.01)
+
+    def stop() -> None:
+        server.should_exit = True
+        thread.join()
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="base URL of a running instance (default: start one in this process)")
+    parser.add_argument("--users", type=int, default=16, help="concurrent simulated users")
+    parser.add_argument("--households", type=int, default=1, help="users are spread over this many households")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="relative weight of each flow")
+    parser.add_argument("--dishes", type=int, default=500, help="synthetic catalog size")
+    parser.add_argument("--history-days", type=int, default=365)
+    parser.add_argument("--query-latency", type=float, default=0.3, help="seconds added to each query")
+    parser.add_argument("--write-latency", type=float, default=1.0, help="seconds added to each history write")
+    parser.add_argument("--metadata-latency", type=float, default=0.05, help="seconds added to each table version check")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="JSON output path (default: benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    mix = parse_mix(args.mix)
+    base_url, stop = (args.url.rstrip("/"), lambda: None) if args.url else start_local_api(args)
+    try:
+        dish_names = discover_dish_names(base_url)
+        results: list[dict[str, FlowResult]] = [defaultdict(FlowResult) for _ in range(args.users)]
+        start = time.perf_counter()
+        deadline = start + args.duration
+        users = [
+            threading.Thread(
+                target=run_user,
+                args=(base_url, household_of(i, args.households), dish_names, mix, deadline, results[i]),
+                name=f"load-user-{i}",
+            )
+            for i in range(args.users)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        duration = time.perf_counter() - start
+    finally:
+        stop()
+
+    merged: dict[str, FlowResult] = defaultdict(FlowResult)
+    for user_results in results:
+        for name, result in user_results.items():
+            merged[name].latencies += result.latencies
+            merged[name].errors += result.errors
+    summaries = [summarize(name, merged[name], duration) for name in FLOWS if name in mix]
+    total = FlowResult([latency for result in merged.values() for latency in result.latencies], sum(r.errors for r in merged.values()))
+    summaries.append(summarize("all", total, duration))
+
+    for summary in summaries:
+        percentiles = "  ".join(f"p{p}={summary[f'p{p}'] * 1000:8.1f} ms" for p in PERCENTILES if f"p{p}" in summary)
+        print(f"{summary['flow']:<18} {summary['throughput']:8.1f} req/s  errors={summary['errors']:<4} {percentiles}")
+
+    output = args.output or Path(__file__).parent / "results" / f"load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            **{key: value for key, value in vars(args).items() if key != "output"},
+            "duration_measured": duration,
+            "env": {key: value for key, value in os.environ.items() if key.startswith("DISH_")},
+        },
+        "results": summaries,
+    }
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Offline benchmarks of the suggestion and ingredient paths on synthetic data.
+
+uv run python benchmarks/run_benchmarks.py --sizes 50 5000 100000 --output benchmarks/results/latest.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from lib.catalog import MenuCatalog  # noqa: E402
+from lib.ingredients import IngredientIndex  # noqa: E402
+from lib.planner import plan_weeks  # noqa: E402
+from lib.preference import PreferenceModel, catalog_features  # noqa: E402
+from lib.recipe import filter_menu_by_holiday, filter_menu_by_season, get_todays_dish, get_weekly_dish  # noqa: E402
+from lib.shopping import aggregate_shopping_list, aggregate_shopping_lists  # noqa: E402
+from lib.synthetic import generate_dataset  # noqa: E402
+
+
+def measure(function: Callable[[], object], repeat: int) -> dict[str, float | int]:
+    function()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+    }
+
+
+def run_size(n_dishes: int, history_days: int, repeat: int) -> list[dict]:
+    dataset = generate_dataset(n_dishes, history_days=history_days)
+    repository = dataset.to_repository()
+
+    dishes = repository.get_menu_data()
+    catalog = MenuCatalog.from_menus(dishes)
+    index = IngredientIndex(repository.get_ingredients_data())
+    recent_menu = dataset.dish_history["menu"].tolist()[:7]
+    history = (dataset.dish_history["menu"].tolist(), dataset.dish_history["date"].tolist())
+    week = get_weekly_dish(catalog, recent_menu)
+    week_names = [menu.name for menu in week]
+    month_names = catalog.names[: min(30, n_dishes)]
+    preference_model = PreferenceModel()
+    preference_model.update(catalog, zip(history[1], history[0], strict=True))
+    preference = preference_model.weights(catalog)
+
+    cases: dict[str, Callable[[], object]] = {
+        "load_menu_data": repository.get_menu_data,
+        "load_ingredients_data": repository.get_ingredients_data,
+        "build_menu_catalog": lambda: MenuCatalog.from_menus(dishes),
+        "build_ingredient_index": lambda: IngredientIndex(dataset.ingredients),
+        "filter_menu_by_season_list": lambda: filter_menu_by_season(dishes, 7),
+        "filter_menu_by_holiday_list": lambda: filter_menu_by_holiday(dishes, False),
+        "filter_menu_by_season_catalog": lambda: filter_menu_by_season(catalog, 7),
+        "filter_menu_by_holiday_catalog": lambda: filter_menu_by_holiday(catalog, False),
+        "get_todays_dish": lambda: get_todays_dish(catalog, recent_menu),
+        "get_weekly_dish": lambda: get_weekly_dish(catalog, recent_menu),
+        "plan_weeks_8": lambda: plan_weeks(catalog, history, 8),
+        "preference_scores": lambda: preference_model.scores(catalog),
+        "build_preference_features": lambda: catalog_features(MenuCatalog.from_menus(dishes)),
+        "get_todays_dish_preference": lambda: get_todays_dish(catalog, recent_menu, preference),
+        "get_weekly_dish_preference": lambda: get_weekly_dish(catalog, recent_menu, preference=preference),
+        "ingredient_lookup_week": lambda: [index.lines_for(name) for name in week_names],
+        "aggregate_week": lambda: aggregate_shopping_list(index, week_names),
+        "aggregate_month": lambda: aggregate_shopping_list(index, month_names),
+        "aggregate_100_households": lambda: aggregate_shopping_lists(index, [week_names] * 100),
+    }
+    return [{"name": name, "n_dishes": n_dishes, "history_days": history_days, **measure(case, repeat)} for name, case in cases.items()]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 5000, 100000], help="catalog sizes (number of dishes)")
+    parser.add_argument("--history-days", type=int, default=365 * 3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None, help="JSON output path (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for result in run_size(size, args.history_days, args.repeat):
+            print(f"{result['name']:<32} n={size:<7} median={result['median'] * 1000:10.3f} ms")
+            results.append(result)
+
+    output = args.output or Path(__file__).parent / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
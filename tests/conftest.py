@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+from lib.repository import SQLiteRepository, set_repository
+
+# テスト用のカタログ (BigQuery の main_dish と同じ列構成)
+MAIN_DISH_COLUMNS = ["menu", "season", "holiday_flag", "store_flag", "interval", "utensil", "main_ingredients", "category"]
+MAIN_DISH_ROWS = [
+    ("カレー", "通年", False, False, 14, "ホットクック", "豚肉", "カレー・シチュー"),
+    ("クリームシチュー", "通年", False, False, 14, "ホットクック", "鶏肉", "カレー・シチュー"),
+    ("ビーフシチュー", "冬", True, False, 21, "ホットクック", "牛肉", "カレー・シチュー"),
+    ("麻婆豆腐", "通年", False, False, 14, "フライパン", "ひき肉", "クックドゥ"),
+    ("回鍋肉", "通年", False, False, 14, "フライパン", "豚肉", "クックドゥ"),
+    ("青椒肉絲", "通年", False, False, 14, "フライパン", "牛肉", "クックドゥ"),
+    ("鍋（豚肉）", "冬", False, False, 7, "鍋", "豚肉", "鍋"),
+    ("キムチ鍋", "冬", False, False, 7, "鍋", "豚肉", "鍋"),
+    ("豚冷しゃぶ", "夏", False, True, 7, "鍋", "豚肉", None),
+    ("ゴーヤチャンプルー", "夏", False, True, 14, "フライパン", "豚肉", None),
+    ("ローストビーフ", "通年", True, True, 28, "オーブン", "牛肉", None),
+    ("ハンバーグ", "通年", True, True, 14, "フライパン", "ひき肉", None),
+    ("唐揚げ", "通年", False, True, 7, "フライパン", "鶏肉", None),
+    ("鶏の照り焼き", "通年", False, False, 7, "フライパン", "鶏肉", None),
+    ("鶏ハム", "通年", False, False, 14, "ホットクック", "鶏肉", None),
+    ("豚の生姜焼き", "通年", False, True, 7, "フライパン", "豚肉", None),
+    ("豚の角煮", "通年", False, False, 21, "ホットクック", "豚肉", None),
+    ("肉じゃが", "通年", False, False, 14, "ホットクック", "牛肉", None),
+    ("牛丼", "通年", False, False, 14, "鍋", "牛肉", None),
+    ("鮭のムニエル", "通年", False, True, 7, "フライパン", "海鮮", None),
+    ("ぶり大根", "冬", False, False, 14, "ホットクック", "海鮮", None),
+    ("さばの味噌煮", "通年", False, False, 14, "ホットクック", "海鮮", None),
+    ("エビチリ", "通年", False, True, 14, "フライパン", "海鮮", None),
+    ("ロールキャベツ", "通年", False, False, 14, "ホットクック", "ひき肉", None),
+    ("餃子", "通年", True, True, 14, "フライパン", "ひき肉", None),
+    ("筑前煮", "通年", False, False, 14, "ホットクック", "鶏肉", None),
+]
+
+INGREDIENTS_COLUMNS = ["menu", "ingredients", "number", "units"]
+INGREDIENTS_ROWS = [
+    ("カレー", "豚肉", 300.0, "g"),
+    ("カレー", "玉ねぎ", 2.0, "個"),
+    ("カレー", "にんじん", 1.0, "本"),
+    ("カレー", "カレールー", 0.5, "箱"),
+    ("クリームシチュー", "鶏肉", 300.0, "g"),
+    ("クリームシチュー", "玉ねぎ", 1.0, "個"),
+    ("クリームシチュー", "牛乳", 400.0, "ml"),
+    ("麻婆豆腐", "ひき肉", 150.0, "g"),
+    ("麻婆豆腐", "豆腐", 1.0, "丁"),
+    ("回鍋肉", "豚肉", 200.0, "g"),
+    ("回鍋肉", "キャベツ", 0.25, "個"),
+    ("豚の生姜焼き", "豚肉", 0.3, "kg"),
+    ("豚の生姜焼き", "玉ねぎ", 1.0, "個"),
+    ("豚の生姜焼き", "醤油", 2.0, "大さじ"),
+    ("鶏の照り焼き", "鶏肉", 1.0, "枚"),
+    ("鶏の照り焼き", "醤油", 30.0, "ml"),
+    ("肉じゃが", "牛肉", 200.0, "g"),
+    ("肉じゃが", "じゃがいも", 3.0, "個"),
+    ("肉じゃが", "玉ねぎ", 1.0, "個"),
+    ("鮭のムニエル", "鮭", 2.0, "切れ"),
+    ("鮭のムニエル", "バター", 10.0, "g"),
+]
+
+
+def _build_sample_repository() -> SQLiteRepository:
+    today = datetime.now(ZoneInfo("Asia/Tokyo")).date()
+    repository = SQLiteRepository(":memory:")
+    repository.load_tables(
+        pd.DataFrame(MAIN_DISH_ROWS, columns=MAIN_DISH_COLUMNS),
+        pd.DataFrame(INGREDIENTS_ROWS, columns=INGREDIENTS_COLUMNS),
+        pd.DataFrame({"date": [today - timedelta(days=1), today - timedelta(days=2)], "menu": ["カレー", "唐揚げ"]}),
+    )
+    return repository
+
+
+# テストは BigQuery ではなくローカルの SQLite バックエンドで実行する
+set_repository(_build_sample_repository())
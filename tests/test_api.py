@@ -0,0 +1,131 @@
+from datetime import timedelta
+
+import pytest
+from api import app
+from fastapi.testclient import TestClient
+from lib.cache import fetch_interval_history, fetch_menu_catalog, fetch_recent_menu_list
+from lib.metrics import registry, set_tracing
+from lib.repository import get_repository, is_valid_household, today_in_japan
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_suggest_today(client):
+    response = client.get("/suggest/today")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["date"] == today_in_japan().isoformat()
+    assert body["dish"]["name"] in fetch_menu_catalog().ids
+
+
+def test_suggest_week(client):
+    response = client.get("/suggest/week")
+
+    assert response.status_code == 200
+    days = response.json()["days"]
+    assert len(days) == 7
+    assert [day["date"] for day in days] == [(today_in_japan() + timedelta(days=i)).isoformat() for i in range(7)]
+    assert len({day["dish"]["name"] for day in days}) == 7
+
+
+def test_suggest_weeks(client):
+    response = client.get("/suggest/weeks", params={"n_weeks": 2})
+
+    assert response.status_code == 200
+    weeks = response.json()
+    assert [len(week["days"]) for week in weeks] == [7, 7]
+    assert weeks[1]["days"][0]["date"] == (today_in_japan() + timedelta(days=7)).isoformat()
+    assert client.get("/suggest/weeks", params={"n_weeks": 9}).status_code == 422
+
+
+def test_ingredients(client):
+    response = client.post("/ingredients", json={"dishes": ["カレー", "肉じゃが"]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["dishes"][0] == {"name": "カレー", "ingredients": ["豚肉 300g", "玉ねぎ 2個", "にんじん 1本", "カレールー 0.5箱"]}
+    assert "玉ねぎ 3個" in body["totals"]
+
+    assert client.post("/ingredients", json={"dishes": ["存在しない料理"]}).status_code == 422
+
+
+def test_register_history(client):
+    today = today_in_japan()
+    response = client.post("/history", json={"entries": [{"date": today.isoformat(), "menu": "筑前煮"}]})
+
+    assert response.json() == {"registered": 1}
+    menu_list, date_list = fetch_recent_menu_list()
+    assert (menu_list[0], date_list[0]) == ("筑前煮", today)
+
+
+def test_history_is_per_household(client):
+    today = today_in_japan()
+    response = client.post(
+        "/history", params={"household": "api-household"}, json={"entries": [{"date": today.isoformat(), "menu": "牛丼"}]}
+    )
+
+    assert response.json() == {"registered": 1}
+    assert fetch_recent_menu_list("api-household") == (["牛丼"], [today])
+    assert fetch_recent_menu_list()[0][0] != "牛丼"
+    assert client.get("/suggest/today", params={"household": "api-household"}).json()["dish"]["name"] != "牛丼"
+    assert client.get("/suggest/today", params={"household": "not valid"}).status_code == 422
+
+
+def test_household_rule_is_shared_with_pages():
+    # app.py のページも API と同じ規則で ?household= を検証する
+    assert is_valid_household("family_1-a")
+    assert not is_valid_household("not valid")
+    assert not is_valid_household("a" * 65)
+
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "cache_hits" in response.text
+
+
+def test_request_spans_are_labelled_by_route(client):
+    registry.reset()
+    set_tracing(True)
+    try:
+        client.get("/metrics")
+        client.get("/no-such-page/12345")
+    finally:
+        set_tracing(False)
+
+    paths = {summary["labels"]["path"] for summary in registry.snapshot()["summaries"] if summary["labels"]["span"] == "api.request"}
+    registry.reset()
+    # リクエストのパスごとに系列を作らない
+    assert paths == {"/metrics", "unmatched"}
+
+
+def test_suggest_today_without_candidates_is_conflict(client, monkeypatch):
+    # 直近に全メニューを食べていて、今日の候補が残っていない
+    monkeypatch.setattr("api._recent_menu", lambda household: list(fetch_menu_catalog().ids))
+    monkeypatch.setattr("lib.suggestion_pool.daily_suggestion_pool.size", 0)
+
+    assert client.get("/suggest/today", params={"household": "no-candidates"}).status_code == 409
+
+
+def test_suggest_weeks_serves_history_from_cache(client, monkeypatch):
+    assert client.get("/suggest/weeks", params={"household": "weeks-cache"}).status_code == 200
+    assert client.get("/suggest/today", params={"household": "weeks-cache"}).status_code == 200
+
+    queries = []
+    repository = get_repository()
+    get_history_since = repository.get_history_since
+    monkeypatch.setattr(repository, "get_history_since", lambda *args: queries.append(args) or get_history_since(*args))
+    today = today_in_japan()
+    client.post("/history", params={"household": "weeks-cache"}, json={"entries": [{"date": today.isoformat(), "menu": "カレー"}]})
+    response = client.get("/suggest/weeks", params={"household": "weeks-cache"})
+
+    # 登録した履歴はキャッシュに書き込まれ、提案のたびに履歴を問い合わせない
+    assert response.status_code == 200
+    assert queries == []
+    assert fetch_interval_history("weeks-cache") == (["カレー"], [today])
@@ -0,0 +1,260 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+from lib.cache import (
+    DatasetCache,
+    HouseholdCaches,
+    _fetch_new_history,
+    apply_registered_history,
+    fetch_recent_menu_list,
+    prefetch,
+    recent_menu_caches,
+)
+from lib.recipe import get_recent_menu, register_dish_history
+from lib.repository import DEFAULT_HOUSEHOLD, HistoryVersions, get_repository, history_versions, today_in_japan
+
+
+def test_dataset_cache_reloads_only_on_version_change():
+    version = {"value": 1}
+    loads = []
+
+    def loader() -> int:
+        loads.append(version["value"])
+        return version["value"]
+
+    cache = DatasetCache("test", loader, lambda: version["value"], ttl=0.0)
+
+    assert cache.get() == 1
+    assert cache.get() == 1
+    version["value"] = 2
+    assert cache.get() == 2
+
+    assert loads == [1, 2]
+    assert (cache.stats.misses, cache.stats.revalidations, cache.stats.refreshes) == (1, 1, 1)
+
+
+def test_dataset_cache_ttl_skips_version_check():
+    checks = []
+    cache = DatasetCache("test", lambda: "value", lambda: checks.append(1) or 1, ttl=3600.0)
+
+    for _ in range(5):
+        assert cache.get() == "value"
+
+    assert len(checks) == 1
+    assert cache.stats.hits == 4
+
+
+def test_update_records_the_written_version_without_checking():
+    checks = []
+    cache = DatasetCache("test", lambda: 1, lambda: checks.append(1) or "loaded", ttl=0.0)
+    cache.get()
+
+    # 書き込みで変わった版を受け取るので、リポジトリには問い合わせない
+    cache.update(lambda value: value + 1, "written")
+    assert len(checks) == 1
+    cache.update(lambda value: value + 1)
+    assert len(checks) == 1
+    assert cache._entry is not None and (cache._entry.value, cache._entry.version) == (3, "written")
+
+
+def test_concurrent_misses_share_one_load():
+    loads = []
+    lock = threading.Lock()
+
+    def loader() -> str:
+        with lock:
+            loads.append(1)
+        time.sleep(0.2)
+        return "value"
+
+    cache = DatasetCache("test", loader, lambda: 1, ttl=3600.0)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: cache.get(), range(8)))
+
+    assert results == ["value"] * 8
+    assert len(loads) == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.shared == 7
+
+
+def test_prefetch_loads_in_parallel():
+    # 3つの読み込みがすべて同時に実行中にならないと先に進めない (順番に読み込むとタイムアウトする)
+    all_loading = threading.Barrier(3, timeout=5.0)
+
+    def loader() -> str:
+        all_loading.wait()
+        return "value"
+
+    caches = [DatasetCache(f"test{i}", loader, lambda: 1, ttl=3600.0) for i in range(3)]
+
+    prefetch(*caches)
+
+    assert all(cache.is_fresh() for cache in caches)
+
+
+def test_apply_registered_history_writes_through():
+    fetch_recent_menu_list()
+    recent_menu_cache = recent_menu_caches[DEFAULT_HOUSEHOLD]
+    misses, refreshes = recent_menu_cache.stats.misses, recent_menu_cache.stats.refreshes
+
+    today = today_in_japan()
+    df = pd.DataFrame({"date": [today, today - timedelta(days=1)], "menu": ["肉じゃが", "牛丼"]})
+    register_dish_history(df)
+    apply_registered_history(df)
+
+    menu_list, date_list = fetch_recent_menu_list()
+    assert menu_list[:2] == ["肉じゃが", "牛丼"]
+    assert date_list[:2] == [today, today - timedelta(days=1)]
+    assert date_list == sorted(date_list, reverse=True)
+    assert (recent_menu_cache.stats.misses, recent_menu_cache.stats.refreshes) == (misses, refreshes)
+
+
+def test_failed_write_behind_drops_written_through_rows():
+    fetch_recent_menu_list("write-behind-failure")
+    pending: Future[None] = Future()
+    df = pd.DataFrame({"date": [today_in_japan()], "menu": ["エビチリ"]})
+    apply_registered_history(df, "write-behind-failure", pending)
+    assert fetch_recent_menu_list("write-behind-failure")[0][0] == "エビチリ"
+
+    # 書き込みが最終的に失敗したら、保存されなかった行はキャッシュから消える
+    pending.set_exception(RuntimeError("warehouse unavailable"))
+    assert "エビチリ" not in fetch_recent_menu_list("write-behind-failure")[0]
+
+
+def test_incremental_history_refresh_merges_new_rows():
+    cache = DatasetCache(
+        "dish_history", get_recent_menu, lambda: get_repository().get_table_version("dish_history"), 0.0, _fetch_new_history
+    )
+    menu_list, date_list = cache.get()
+
+    today = today_in_japan()
+    register_dish_history(pd.DataFrame({"date": [today], "menu": ["ぶり大根"]}))
+    refreshed_menus, refreshed_dates = cache.get()
+
+    assert cache.stats.refreshes == 1
+    assert (refreshed_menus[0], refreshed_dates[0]) == ("ぶり大根", today)
+    assert (refreshed_menus, refreshed_dates) == get_recent_menu()
+    assert get_recent_menu(days=1)[1] == [day for day in refreshed_dates if day >= today - timedelta(days=1)]
+
+
+def test_refresher_falls_back_to_full_reload_after_interval():
+    version = {"value": 1}
+    calls = []
+    cache = DatasetCache(
+        "test",
+        lambda: calls.append("load") or "loaded",
+        lambda: version["value"],
+        ttl=0.0,
+        refresher=lambda value: calls.append("refresh") or "refreshed",
+        full_reload_interval=0.2,
+    )
+
+    cache.get()
+    version["value"] = 2
+    assert cache.get() == "refreshed"
+    time.sleep(0.2)
+    version["value"] = 3
+    # 最後に全体を読み込んでから full_reload_interval 経つと、差分ではなく全体を読み直す
+    assert cache.get() == "loaded"
+    assert calls == ["load", "refresh", "load"]
+
+
+def test_history_cache_ignores_other_households_registrations():
+    today = today_in_japan()
+    register_dish_history(pd.DataFrame({"date": [today], "menu": ["親子丼"]}), household="version-a")
+    cache = recent_menu_caches["version-a"]
+    cache.ttl = 0.0
+    assert fetch_recent_menu_list("version-a") == (["親子丼"], [today])
+
+    register_dish_history(pd.DataFrame({"date": [today], "menu": ["天丼"]}), household="version-b")
+    fetch_recent_menu_list("version-a")
+    assert (cache.stats.misses, cache.stats.refreshes, cache.stats.revalidations) == (1, 0, 1)
+
+    # 同じ日付の献立の書き換えでも、その世帯の版は変わる
+    register_dish_history(pd.DataFrame({"date": [today], "menu": ["カツ丼"]}), household="version-a")
+    assert fetch_recent_menu_list("version-a") == (["カツ丼"], [today])
+    assert cache.stats.refreshes == 1
+
+    # 他のプロセス (リポジトリへの直接の書き込み) の登録は、どの世帯の変更かわからないので読み直す
+    get_repository().register_dish_history(pd.DataFrame({"date": [today], "menu": ["牛丼"], "household_id": ["version-b"]}))
+    fetch_recent_menu_list("version-a")
+    assert cache.stats.refreshes == 2
+
+
+def test_history_versions_notice_other_workers_writes():
+    today = today_in_japan()
+
+    def registration(household: str, menu: str) -> pd.DataFrame:
+        return pd.DataFrame({"date": [today], "menu": [menu], "household_id": [household]})
+
+    worker, other_worker = HistoryVersions(), HistoryVersions()
+    marker = worker.version("worker-b")
+
+    # 自分の書き込みだけなら、他の世帯の版は変わらない
+    worker.register(registration("worker-a", "カレー"))
+    assert worker.version("worker-b") == marker
+
+    # 自分の書き込みの後に他のワーカーが書き込んだ場合は、その世帯の版も変わる
+    worker.register(registration("worker-a", "餃子"))
+    other_worker.register(registration("worker-b", "牛丼"))
+    assert worker.version("worker-b") != marker
+
+    # 他のワーカーの書き込みの後に自分が書き込んだ場合は区別できないので、revalidate_interval 後に全世帯の版を変える
+    worker = HistoryVersions(revalidate_interval=0.2)
+    marker = worker.version("worker-b")
+    other_worker.register(registration("worker-b", "親子丼"))
+    worker.register(registration("worker-a", "天丼"))
+    assert worker.version("worker-b") == marker
+    time.sleep(0.2)
+    assert worker.version("worker-b") != marker
+
+
+def test_write_behind_history_is_current_once_written(monkeypatch):
+    today = today_in_japan()
+    fetch_recent_menu_list("write-behind-landing")
+    cache = recent_menu_caches["write-behind-landing"]
+    cache.ttl = 0.0
+    repository = get_repository()
+    checks = []
+    get_table_version = repository.get_table_version
+    monkeypatch.setattr(repository, "get_table_version", lambda table: checks.append(table) or get_table_version(table))
+
+    df = pd.DataFrame({"date": [today], "menu": ["エビチリ"]})
+    pending: Future[None] = Future()
+    apply_registered_history(df, "write-behind-landing", pending)
+    # 書き込みキューに積むだけで、版の確認は行わない
+    assert checks == []
+
+    # 書き込んだ直後の版だけを読む (write-behind では書き込みスレッドで行う)
+    history_versions.register(df.assign(household_id="write-behind-landing"))
+    assert checks == ["dish_history"]
+    pending.set_result(None)
+    assert fetch_recent_menu_list("write-behind-landing") == (["エビチリ"], [today])
+    assert (cache.stats.misses, cache.stats.refreshes) == (1, 0)
+
+
+def test_household_history_is_separate_and_caches_are_lru_bounded():
+    today = today_in_japan()
+    register_dish_history(pd.DataFrame({"date": [today], "menu": ["餃子"]}), household="household-a")
+
+    assert fetch_recent_menu_list("household-a") == (["餃子"], [today])
+    assert fetch_recent_menu_list("household-b") == ([], [])
+    assert "餃子" not in fetch_recent_menu_list()[0][:1]
+
+    caches = HouseholdCaches("test", lambda household: DatasetCache(household, lambda: household, lambda: 1, ttl=3600.0), max_households=2)
+    first = caches["a"]
+    caches["b"].get()
+    assert caches["a"] is first
+    caches["c"]
+
+    # 最も長く使われていない b が捨てられる
+    assert len(caches) == 2
+    assert "b" not in caches and "a" in caches
+    assert caches.evictions == 1
+    # 捨てたキャッシュの stats も合計に残る
+    assert caches.stats.misses == 1
+    assert caches["b"].get() == "b"
+    assert caches.stats.misses == 2
@@ -1,7 +1,25 @@
+import random
 from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
 
+import numpy as np
 import pandas as pd
-from lib.recipe import filter_menu_by_holiday, filter_menu_by_season, get_ingredients_data, get_menu_data, get_recent_menu, get_weekly_dish
+import pytest
+from lib import solver
+from lib.batch import generate_weekly_plans
+from lib.catalog import MenuCatalog
+from lib.planner import MAX_WEEKS, plan_weeks
+from lib.recipe import (
+    filter_menu_by_holiday,
+    filter_menu_by_season,
+    get_day_weights,
+    get_ingredients_data,
+    get_menu_data,
+    get_recent_menu,
+    get_todays_dish,
+    get_weekly_dish,
+)
+from lib.solver import WeeklyConstraints
 from lib.util import Menu
 
 # Load data
@@ -9,7 +27,7 @@ dishes: list[Menu] = get_menu_data()
 dish_list = [dish.name for dish in dishes]
 
 df_ingredients: pd.DataFrame = get_ingredients_data()
-recent_menu: list[str] = get_recent_menu()
+recent_menu: list[str] = get_recent_menu()[0]
 
 
 def test_get_weekly_dish():
@@ -51,6 +69,177 @@ def test_get_weekly_dish():
             ), f"{category} used {used_category_counts[category]} times, exceeding {max_count}"
 
 
+def test_get_weekly_dish_backtracks():
+    # 保存可能なメニューがちょうど5品しかなく、今日・明日にそれを選ぶと行き詰まるカタログ
+    def menu(name: str, not_storable: bool, main_ingredient: str) -> Menu:
+        return Menu(
+            name=name,
+            season="通年",
+            holiday_only=False,
+            not_storable=not_storable,
+            interval=1,
+            cooking_method="フライパン",
+            main_ingredient=main_ingredient,
+            category=None,
+        )
+
+    menus = [menu(f"作り置き{i}", False, "豚肉" if i < 3 else "鶏肉") for i in range(5)]
+    menus += [menu("唐揚げ", True, "鶏肉"), menu("ステーキ", True, "牛肉"), menu("刺身", True, "海鮮")]
+    constraints = WeeklyConstraints(ingredient_caps={"豚肉": 3, "鶏肉": 2}, not_storable_weight=1)
+
+    for _ in range(20):
+        weekly_menu = get_weekly_dish(menus, [], constraints)
+        assert len({menu.name for menu in weekly_menu}) == 7
+        assert all(not menu.not_storable for menu in weekly_menu[2:])
+        assert [menu.main_ingredient for menu in weekly_menu].count("鶏肉") <= 2
+
+
+def test_get_weekly_dish_infeasible():
+    menus = [
+        Menu(
+            name=f"豚肉料理{i}",
+            season="通年",
+            holiday_only=False,
+            not_storable=False,
+            interval=1,
+            cooking_method="フライパン",
+            main_ingredient="豚肉",
+            category=None,
+        )
+        for i in range(10)
+    ]
+
+    with pytest.raises(ValueError):
+        get_weekly_dish(menus, [], WeeklyConstraints(ingredient_caps={"豚肉": 3}))
+
+
+@pytest.mark.parametrize(
+    "groups",
+    [
+        # 食材の上限の合計が7日に足りない
+        [("海鮮", None, 15), ("牛肉", None, 15), ("鶏肉", None, 2)],
+        # 食材・カテゴリそれぞれの上限は足りるが、組み合わせると足りない
+        [("野菜", "鍋", 15), ("海鮮", None, 15), ("牛肉", None, 15)],
+    ],
+)
+def test_get_weekly_dish_infeasible_fails_fast(groups, monkeypatch):
+    menus = [
+        Menu(
+            name=f"{ingredient}料理{i}",
+            season="通年",
+            holiday_only=False,
+            not_storable=False,
+            interval=1,
+            cooking_method="フライパン",
+            main_ingredient=ingredient,
+            category=category,
+        )
+        for ingredient, category, count in groups
+        for i in range(count)
+    ]
+
+    # 探索した日の数 (search の呼び出しごとに候補の順序を1回作る) を数える
+    orders = []
+    weighted_order = solver.weighted_order
+    monkeypatch.setattr(solver, "weighted_order", lambda *args: orders.append(1) or weighted_order(*args))
+
+    with pytest.raises(ValueError):
+        get_weekly_dish(menus, [])
+    # 先読みと入れ替え可能な候補の枝刈りで、候補の組み合わせを総当たりしない
+    assert len(orders) <= 50
+
+
+def test_day_weights_follow_storable_from_day():
+    catalog = MenuCatalog.from_menus(dishes)
+    constraints = WeeklyConstraints(storable_from_day=3, not_storable_weight=4)
+    weights = get_day_weights(catalog, [], date(2024, 10, 7), constraints)
+
+    # 保存不可メニューは storable_from_day より前の日 (2024-10-07 からの平日) だけ選べて、その日は重みが付く
+    not_storable = catalog.not_storable & catalog.season_mask(10) & catalog.holiday_mask(False)
+    assert not_storable.any()
+    assert (weights[:3, not_storable] == 4).all()
+    assert (weights[3:, catalog.not_storable] == 0).all()
+
+
+# UTC では日曜 15:03、日本時間では月曜 00:03
+PINNED_NOW = datetime(2026, 10, 18, 15, 3, tzinfo=timezone.utc)
+
+
+class _PinnedClock(datetime):
+    @classmethod
+    def now(cls, tz=None):  # type: ignore[override]
+        # サーバーのローカル時刻は UTC とする
+        return PINNED_NOW.astimezone(tz) if tz else PINNED_NOW.replace(tzinfo=None)
+
+    @classmethod
+    def today(cls):  # type: ignore[override]
+        return cls.now()
+
+
+def test_suggestions_follow_japan_date_on_utc_host(monkeypatch):
+    for module in ("lib.repository", "lib.recipe"):
+        monkeypatch.setattr(f"{module}.datetime", _PinnedClock, raising=False)
+    catalog = MenuCatalog.from_menus(dishes)
+
+    # 日本時間の月曜から始まる週なので、休日限定メニューは土日 (5, 6 日目) にしか入らない
+    for _ in range(20):
+        weekly_menu = get_weekly_dish(catalog, [])
+        assert all(day >= 5 for day, menu in enumerate(weekly_menu) if menu.holiday_only)
+        assert not get_todays_dish(catalog, []).holiday_only
+
+    # 日付を渡せばその日の曜日で選ぶ
+    saturday = date(2026, 10, 24)
+    assert any(get_todays_dish(catalog, [], today=saturday).holiday_only for _ in range(200))
+    assert all(not menu.holiday_only for menu in get_weekly_dish(catalog, [], start=saturday)[2:7])
+
+
+def test_generate_weekly_plans():
+    constraints_ingredients = {"海鮮": 2, "牛肉": 2, "豚肉": 3, "鶏肉": 3}
+    catalog = MenuCatalog.from_menus(dishes)
+    batch = generate_weekly_plans(catalog, recent_menu, n=500, top_k=20, rng=np.random.default_rng(0))
+
+    assert batch.n_valid > 0
+    assert batch.plans.shape == (min(20, batch.n_valid), 7)
+    assert list(batch.scores) == sorted(batch.scores, reverse=True)
+
+    for weekly_menu in batch.to_menus(catalog):
+        assert len({menu.name for menu in weekly_menu}) == 7
+        assert not {menu.name for menu in weekly_menu} & set(recent_menu)
+        assert all(not menu.not_storable for menu in weekly_menu[2:])
+        for ingredient, max_count in constraints_ingredients.items():
+            assert [menu.main_ingredient for menu in weekly_menu].count(ingredient) <= max_count
+
+
+def test_plan_weeks_enforces_intervals():
+    start = date(2024, 10, 7)
+    history = (["カレー", "唐揚げ"], [start - timedelta(days=1), start - timedelta(days=3)])
+    weeks = plan_weeks(dishes, history, n_weeks=2, start=start, rng=random.Random(0))
+
+    assert len(weeks) == 2
+    served = {"カレー": [start - timedelta(days=1)], "唐揚げ": [start - timedelta(days=3)]}
+    for week, weekly_menu in enumerate(weeks):
+        assert len({menu.name for menu in weekly_menu}) == 7
+        assert [menu.main_ingredient for menu in weekly_menu].count("豚肉") <= 3
+        for day, menu in enumerate(weekly_menu):
+            served.setdefault(menu.name, []).append(start + timedelta(weeks=week, days=day))
+
+    intervals = {dish.name: dish.interval for dish in dishes}
+    for name, days in served.items():
+        assert all((later - earlier).days >= intervals[name] for earlier, later in zip(days, days[1:], strict=False))
+
+    with pytest.raises(ValueError):
+        plan_weeks(dishes, history, n_weeks=MAX_WEEKS + 1)
+
+
+def test_plan_weeks_follow_japan_date_on_utc_host(monkeypatch):
+    monkeypatch.setattr("lib.repository.datetime", _PinnedClock)
+
+    # 日本時間の月曜から始まるので、どの週も休日限定メニューは土日 (5, 6 日目) にしか入らない
+    for _ in range(10):
+        weeks = plan_weeks(dishes, ([], []), n_weeks=2)
+        assert all(day >= 5 for weekly_menu in weeks for day, menu in enumerate(weekly_menu) if menu.holiday_only)
+
+
 def tests_weekend_filter():
     # テスト用のメニューリスト
     menus = [
@@ -152,3 +341,21 @@ def test_filter_menu_by_season():
     assert "カレー" in [menu.name for menu in filtered_spring]
     assert "豚冷しゃぶ" not in [menu.name for menu in filtered_spring]
     assert "鍋（豚肉）" not in [menu.name for menu in filtered_spring]
+
+
+def test_menu_catalog_matches_list_filters():
+    catalog = MenuCatalog.from_menus(dishes)
+
+    assert list(catalog) == dishes
+    assert catalog[catalog.ids["カレー"]].name == "カレー"
+    for month in range(1, 13):
+        assert filter_menu_by_season(catalog, month) == filter_menu_by_season(dishes, month)
+    for is_weekend in (False, True):
+        assert filter_menu_by_holiday(catalog, is_weekend) == filter_menu_by_holiday(dishes, is_weekend)
+    assert catalog.select(catalog.names_mask(["カレー", "存在しないメニュー"])) == [catalog[catalog.ids["カレー"]]]
+
+    # selectbox の選択肢と位置 (先頭の "" は未選択)
+    assert catalog.options == ["", *[dish.name for dish in dishes]]
+    assert catalog.options is catalog.options
+    assert catalog.options[catalog.option_index("カレー")] == "カレー"
+    assert catalog.option_index("") == catalog.option_index("存在しないメニュー") == 0
@@ -0,0 +1,56 @@
+from lib.cache import DatasetCache
+from lib.catalog import MenuCatalog
+from lib.ingredients import IngredientIndex
+from lib.repository import DiskCachedRepository
+from lib.synthetic import generate_dataset
+from lib.table_store import TableStore
+
+
+def test_disk_cache_downloads_only_changed_tables(tmp_path, monkeypatch):
+    dataset = generate_dataset(50, history_days=10)
+    source = dataset.to_repository()
+    downloads = []
+    get_menu_data = source.get_menu_data
+    monkeypatch.setattr(source, "get_menu_data", lambda: downloads.append("main_dish") or get_menu_data())
+
+    menus = DiskCachedRepository(source, str(tmp_path)).get_menu_data()
+    # 別プロセス相当の新しいインスタンスはディスク上のファイルを使う
+    assert DiskCachedRepository(source, str(tmp_path)).get_menu_data() == menus
+    assert downloads == ["main_dish"]
+
+    source.load_tables(dataset.main_dish.iloc[:10], dataset.ingredients)
+    repository = DiskCachedRepository(source, str(tmp_path))
+    assert len(repository.get_menu_data()) == 10
+    assert downloads == ["main_dish", "main_dish"]
+
+    ingredients = repository.get_ingredients_data()
+    assert ingredients.equals(repository.get_ingredients_data())
+    assert ingredients.equals(source.get_ingredients_data())
+    stored = TableStore(tmp_path).read("ingredients")
+    assert stored is not None and stored.version == source.get_table_version("ingredients")
+
+
+def test_disk_cache_checks_version_once_and_builds_from_arrow(tmp_path, monkeypatch):
+    dataset = generate_dataset(50, history_days=10)
+    source = dataset.to_repository()
+    DiskCachedRepository(source, str(tmp_path)).get_ingredient_index()
+
+    checks = []
+    get_table_version = source.get_table_version
+    monkeypatch.setattr(source, "get_table_version", lambda table: checks.append(table) or get_table_version(table))
+    repository = DiskCachedRepository(source, str(tmp_path))
+    cache = DatasetCache("ingredients", repository.get_ingredient_index, lambda: repository.get_table_version("ingredients"), 0.0)
+    index = cache.get()
+
+    # DatasetCache の確認したバージョンで読み込み、もう一度は問い合わせない
+    assert checks == ["ingredients"]
+    assert sorted(index.ranges) == sorted(set(dataset.ingredients["menu"]))
+    assert index.lines_for(index.menus[0]) == IngredientIndex(source.get_ingredients_data()).lines_for(index.menus[0])
+    # 数値の列はメモリマップしたファイルをそのまま参照する
+    assert not index.numbers.flags.owndata
+
+    catalog = repository.get_menu_catalog()
+    assert list(catalog) == list(MenuCatalog.from_menus(source.get_menu_data()))
+    # 辞書符号化した列のコードと interval もファイルのバッファを参照する
+    assert not catalog.ingredient_codes.flags.owndata and not catalog.category_codes.flags.owndata
+    assert not catalog.intervals.flags.owndata
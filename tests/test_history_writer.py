@@ -0,0 +1,60 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+from lib.history_writer import HistoryWriteQueue
+from lib.repository import get_repository
+
+
+def test_write_behind_groups_submissions():
+    queue = HistoryWriteQueue(flush_interval=0.2)
+    futures = [
+        queue.submit(pd.DataFrame({"date": [date(2000, 1, 1)], "menu": ["カレー"]})),
+        queue.submit(pd.DataFrame({"date": [date(2000, 1, 2)], "menu": ["牛丼"]})),
+        queue.submit(pd.DataFrame({"date": [date(2000, 1, 1)], "menu": ["肉じゃが"]})),
+    ]
+    for future in futures:
+        future.result(timeout=5)
+    queue.close()
+
+    assert queue.stats.submissions == 3
+    assert queue.stats.flushes == 1
+    assert queue.stats.rows_written == 3
+
+    # 同じ日付は後から登録したメニューで上書きされる
+    history = get_repository()
+    with history._connect() as conn:
+        rows = conn.execute("SELECT date, menu FROM dish_history WHERE date < '2001-01-01' ORDER BY date").fetchall()
+    assert rows == [("2000-01-01", "肉じゃが"), ("2000-01-02", "牛丼")]
+
+
+def test_failed_batches_are_retried_then_surface(monkeypatch):
+    repository = get_repository()
+    write = repository.register_dish_history
+    calls = []
+
+    def flaky(df: pd.DataFrame) -> None:
+        calls.append(len(df))
+        if len(calls) == 1 or df["menu"].eq("失敗").any():
+            raise RuntimeError("warehouse unavailable")
+        write(df)
+
+    monkeypatch.setattr(repository, "register_dish_history", flaky)
+    queue = HistoryWriteQueue(flush_interval=0.05, attempts=2)
+    # 1 回目の失敗は次の書き込みで再試行される
+    queue.submit(pd.DataFrame({"date": [date(2000, 2, 1)], "menu": ["カレー"]})).result(timeout=5)
+    # 再試行しても失敗した投稿の Future は例外になる
+    with pytest.raises(RuntimeError):
+        queue.submit(pd.DataFrame({"date": [date(2000, 2, 2)], "menu": ["失敗"]})).result(timeout=5)
+    queue.close()
+
+    assert (queue.stats.flushes, queue.stats.retries, queue.stats.failures) == (1, 2, 1)
+
+
+def test_close_writes_queued_rows():
+    queue = HistoryWriteQueue(flush_interval=60.0)
+    future = queue.submit(pd.DataFrame({"date": [date(2000, 3, 1)], "menu": ["牛丼"]}))
+    queue.close()
+
+    assert future.done() and future.exception() is None
+    assert queue.stats.rows_written == 1
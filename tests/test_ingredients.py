@@ -0,0 +1,62 @@
+import pandas as pd
+from lib.ingredients import IngredientIndex
+from lib.recipe import get_ingredients_data
+from lib.shopping import aggregate_shopping_list, aggregate_shopping_lists
+
+# Load data
+df_ingredients: pd.DataFrame = get_ingredients_data()
+ingredient_index = IngredientIndex(df_ingredients)
+
+
+def test_lines_for_matches_dataframe_filter():
+    for dish in df_ingredients["menu"].unique():
+        df_target = df_ingredients[df_ingredients["menu"] == dish]
+        expected = [f"{row['ingredients']} {row['number']:g}{row['units']}" for _, row in df_target.iterrows()]
+        assert ingredient_index.lines_for(dish) == expected
+
+    # 材料が登録されていないメニューは空
+    assert ingredient_index.lines_for("存在しないメニュー") == []
+    assert ingredient_index.lines_for("") == []
+
+
+def test_text_for_is_memoized_per_dish():
+    text = ingredient_index.text_for("カレー")
+
+    assert text == "\n".join(ingredient_index.lines_for("カレー"))
+    assert ingredient_index.text_for("カレー") is text
+    assert ingredient_index.text_for("") == ""
+
+
+def test_to_frame_keeps_duplicates():
+    df_target = ingredient_index.to_frame(["カレー", "", "カレー"])
+    n_curry = (df_ingredients["menu"] == "カレー").sum()
+
+    assert len(df_target) == 2 * n_curry
+    assert set(df_target["menu"]) == {"カレー"}
+
+
+def test_aggregate_shopping_list_converts_units():
+    shopping_list = aggregate_shopping_list(ingredient_index, ["カレー", "回鍋肉", "豚の生姜焼き", "鶏の照り焼き", "クリームシチュー"])
+    totals = {(row.ingredients, row.units): row.number for row in shopping_list.totals.itertuples()}
+
+    # 300g + 200g + 0.3kg
+    assert totals[("豚肉", "g")] == 800
+    # 大さじ2 + 30ml
+    assert totals[("醤油", "ml")] == 60
+    assert totals[("玉ねぎ", "個")] == 4
+
+    # g と 枚 は換算できないので別々に集計される
+    assert totals[("鶏肉", "g")] == 300
+    assert totals[("鶏肉", "枚")] == 1
+    assert shopping_list.unconverted_ingredients() == ["鶏肉"]
+    assert "豚肉 800g" in shopping_list.lines()
+
+
+def test_aggregate_shopping_lists_per_plan():
+    plans = [["カレー"], ["カレー", "カレー"], []]
+    shopping_list = aggregate_shopping_lists(ingredient_index, plans)
+    pork = shopping_list.totals[shopping_list.totals["ingredients"] == "豚肉"]
+
+    assert pork["plan"].tolist() == [0, 1]
+    assert pork["number"].tolist() == [300, 600]
+    assert shopping_list.lines(plan=2) == []
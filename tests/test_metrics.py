@@ -0,0 +1,52 @@
+import json
+import logging
+
+import pytest
+from lib import metrics
+from lib.cache import DatasetCache
+from lib.metrics import registry, set_tracing, span
+
+
+@pytest.fixture
+def tracing():
+    registry.reset()
+    set_tracing(True)
+    yield
+    set_tracing(False)
+    registry.reset()
+
+
+def test_span_is_noop_when_disabled():
+    registry.reset()
+    with span("test.disabled", table="main_dish") as disabled_span:
+        disabled_span.set(rows=1)
+
+    assert disabled_span is metrics._NULL_SPAN
+    assert registry.snapshot()["summaries"] == []
+
+
+def test_span_records_duration_and_logs_json(tracing, caplog):
+    with caplog.at_level(logging.INFO, logger="lib.metrics"):
+        with span("bigquery.query", table="main_dish") as query_span:
+            query_span.set(job_id="job-1", rows=3)
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["span"] == "bigquery.query"
+    assert (record["table"], record["job_id"], record["rows"], record["status"]) == ("main_dish", "job-1", 3, "ok")
+
+    text = registry.render_prometheus()
+    assert 'span_duration_seconds_count{span="bigquery.query",table="main_dish"} 1' in text
+
+
+def test_cache_requests_are_counted(tracing):
+    cache = DatasetCache("metrics_test", lambda: "value", lambda: 1, ttl=3600.0)
+    cache.get()
+    cache.get()
+
+    counters = {
+        (c["name"], c["labels"].get("result")): c["value"]
+        for c in registry.snapshot()["counters"]
+        if c["labels"].get("dataset") == "metrics_test"
+    }
+    assert counters == {("cache_requests_total", "miss"): 1.0, ("cache_requests_total", "hit"): 1.0}
+    assert 'cache_misses{dataset="main_dish"}' in registry.render_prometheus()
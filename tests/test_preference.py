@@ -0,0 +1,81 @@
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from lib.cache import fetch_menu_catalog
+from lib.preference import N_FEATURES, PreferenceModel, catalog_features, get_preference_weights, reset_preference_models
+from lib.recipe import get_day_weights, get_todays_dish
+
+
+def test_catalog_features_one_hot_per_field():
+    catalog = fetch_menu_catalog()
+    features = catalog_features(catalog)
+
+    assert features.shape == (len(catalog), N_FEATURES)
+    assert catalog_features(catalog) is features
+    # 料理方法・主な食材・カテゴリ・季節の 4 つ (ハッシュの衝突がなければ)
+    assert set(np.diff(features.indptr)) <= {3, 4}
+    curry, stew = catalog.ids["カレー"], catalog.ids["クリームシチュー"]
+    assert features[curry].multiply(features[stew]).sum() == 3  # 食材以外は同じ
+
+
+def test_preference_model_learns_from_history_and_updates_incrementally():
+    catalog = fetch_menu_catalog()
+    fried = [name for name in catalog.names if catalog[catalog.ids[name]].cooking_method == "フライパン"]
+    start = date(2024, 1, 1)
+    history = [(start + timedelta(days=day), fried[day % len(fried)]) for day in range(120)]
+
+    model = PreferenceModel(seed=1)
+    assert model.update(catalog, history[:100]) == 100
+    assert model.update(catalog, history) == 20
+    assert model.update(catalog, history) == 0
+
+    weights = model.weights(catalog)
+    assert (weights > 0).all()
+    is_fried = np.array([catalog[i].cooking_method == "フライパン" for i in range(len(catalog))])
+    assert weights[is_fried].mean() > weights[~is_fried].mean()
+    assert model.weights(catalog) is weights
+
+    # 好みの重みは日ごとの重みに掛けられ、選べないメニューは 0 のまま
+    day_weights = get_day_weights(catalog, ["カレー"], date(2024, 10, 7), preference=weights)
+    assert day_weights[:, catalog.ids["カレー"]].max() == 0
+    assert day_weights[0, catalog.ids["麻婆豆腐"]] == weights[catalog.ids["麻婆豆腐"]]
+    assert get_todays_dish(catalog, [], weights).name in catalog.ids
+
+
+def test_first_load_of_one_household_does_not_block_others(monkeypatch):
+    monkeypatch.setenv("DISH_PREFERENCE", "1")
+    reset_preference_models()
+    loading = threading.Event()
+    release = threading.Event()
+
+    def get_recent_menu(days: int, household: str) -> tuple[list[str], list[date]]:
+        if household == "slow":
+            loading.set()
+            release.wait(timeout=5)
+        return ["唐揚げ"], [date.today()]
+
+    monkeypatch.setattr("lib.preference.get_recent_menu", get_recent_menu)
+    catalog = fetch_menu_catalog()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        slow = executor.submit(get_preference_weights, catalog, "slow")
+        assert loading.wait(timeout=5)
+        # 別の世帯は、遅い世帯の履歴の取得を待たずに重みを得られる
+        fast = executor.submit(get_preference_weights, catalog, "fast")
+        try:
+            assert fast.result(timeout=1) is not None
+        finally:
+            release.set()
+        assert slow.result(timeout=5) is not None
+    reset_preference_models()
+
+
+def test_suggestion_pool_import_does_not_load_sklearn():
+    # 好みの学習を使わないプロセスは scikit-learn / SciPy を読み込まない
+    code = "import sys, lib.suggestion_pool; print(sorted({'sklearn', 'scipy'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=Path(__file__).parents[1] / "app")
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,43 @@
+import time
+
+from lib.cache import fetch_menu_catalog, ingredient_index_cache, menu_catalog_cache
+from lib.repository import get_repository
+from lib.snapshot import load_snapshot, read_snapshot, reset_snapshot, write_snapshot
+from lib.table_store import TableStore
+
+
+def test_snapshot_round_trip(tmp_path):
+    written = write_snapshot(tmp_path)
+    snapshot = read_snapshot(tmp_path)
+
+    assert snapshot is not None
+    assert snapshot.menus == get_repository().get_menu_data()
+    assert snapshot.ingredients.equals(written.ingredients)
+    assert snapshot.versions == {"main_dish": "1", "ingredients": "1"}
+    assert read_snapshot(tmp_path / "missing") is None
+
+
+def test_load_snapshot_seeds_caches_and_revalidates_in_background(tmp_path):
+    write_snapshot(tmp_path)
+    store = TableStore(tmp_path)
+    main_dish = store.read("main_dish")
+    assert main_dish is not None
+    store.write("main_dish", main_dish.table, "stale")
+
+    menu_catalog_cache.clear()
+    ingredient_index_cache.clear()
+    reset_snapshot()
+    misses, refreshes = menu_catalog_cache.stats.misses, menu_catalog_cache.stats.refreshes
+    try:
+        assert load_snapshot(tmp_path)
+        assert len(fetch_menu_catalog()) == len(get_repository().get_menu_data())
+        assert menu_catalog_cache.stats.misses == misses
+
+        # スナップショットのバージョンが古いので、バックグラウンドで読み込み直される
+        deadline = time.monotonic() + 5
+        while menu_catalog_cache.stats.refreshes == refreshes and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert menu_catalog_cache.stats.refreshes == refreshes + 1
+        assert not load_snapshot(tmp_path)
+    finally:
+        reset_snapshot()
@@ -0,0 +1,101 @@
+import threading
+import time
+from datetime import date
+
+from lib.cache import fetch_menu_catalog
+from lib.repository import today_in_japan
+from lib.suggestion_pool import SuggestionPool
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_pool_pops_pregenerated_suggestions_and_rebuilds_on_new_history():
+    catalog = fetch_menu_catalog()
+    calls = []
+    lock = threading.Lock()
+
+    def generate(catalog, recent_menu, household, today):
+        with lock:
+            calls.append(tuple(recent_menu))
+        return len(calls)
+
+    pool = SuggestionPool("test", generate, size=4)
+    try:
+        pool.prime(catalog, ["カレー"])
+        wait_until(lambda: len(pool) == 4)
+        assert len(pool) == 4
+
+        assert pool.pop(catalog, ["カレー"]) == 1
+        assert (pool.stats.hits, pool.stats.misses) == (1, 0)
+
+        # 履歴が変わったら、それまでの提案は捨てて作り直す
+        pool.pop(catalog, ["唐揚げ"])
+        assert (pool.stats.misses, pool.stats.rebuilds) == (1, 2)
+        wait_until(lambda: len(pool) == 4)
+        assert pool.pop(catalog, ["唐揚げ"]) > 4
+        assert pool.stats.hit_ratio == 2 / 3
+    finally:
+        pool.close()
+
+
+def test_pool_does_not_retry_failing_inputs():
+    attempts = []
+
+    def generate(catalog, recent_menu, household, today):
+        attempts.append(1)
+        raise ValueError("No menu available for selection based on constraints.")
+
+    pool = SuggestionPool("failing", generate, size=4)
+    try:
+        pool.prime(fetch_menu_catalog(), [])
+        time.sleep(0.2)
+        assert len(attempts) == 1
+        assert len(pool) == 0
+    finally:
+        pool.close()
+
+
+def test_pool_keeps_a_slot_per_household():
+    catalog = fetch_menu_catalog()
+
+    pool = SuggestionPool("households", lambda catalog, recent_menu, household, today: household, size=2, max_households=2)
+    try:
+        pool.prime(catalog, [], "a")
+        pool.prime(catalog, ["カレー"], "b")
+        wait_until(lambda: len(pool) == 4)
+
+        # 世帯ごとの直近メニューで作った提案を取り出し、他の世帯の提案は作り直さない
+        assert pool.pop(catalog, [], "a") == "a"
+        assert pool.pop(catalog, ["カレー"], "b") == "b"
+        assert (pool.stats.hits, pool.stats.rebuilds) == (2, 2)
+
+        # 最も長く使われていない a が捨てられ、次の a の提案はその場で作る
+        pool.prime(catalog, [], "c")
+        assert pool.stats.evictions == 1
+        assert pool.pop(catalog, [], "a") == "a"
+        assert (pool.stats.misses, pool.stats.rebuilds) == (1, 4)
+    finally:
+        pool.close()
+
+
+def test_pool_generates_for_the_date_of_its_slot():
+    catalog = fetch_menu_catalog()
+
+    pool = SuggestionPool("dates", lambda catalog, recent_menu, household, today: today, size=2)
+    try:
+        pool.prime(catalog, [])
+        wait_until(lambda: len(pool) == 2)
+        assert pool.pop(catalog, []) == today_in_japan()
+
+        # 日付が変わるとその日の提案を作り直す
+        monday = date(2024, 10, 7)
+        assert pool.pop(catalog, [], today=monday) == monday
+        wait_until(lambda: len(pool) == 2)
+        assert pool.pop(catalog, [], today=monday) == monday
+        assert pool.stats.rebuilds == 2
+    finally:
+        pool.close()
@@ -0,0 +1,64 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from lib.catalog import MenuCatalog
+from lib.ingredients import IngredientIndex
+from lib.recipe import get_weekly_dish
+from lib.repository import BigQueryRepository, SQLiteRepository, today_in_japan
+from lib.synthetic import generate_dataset
+
+
+def test_generate_dataset_loads_into_repository():
+    dataset = generate_dataset(200, history_days=30, seed=1)
+    repository = dataset.to_repository()
+
+    dishes = repository.get_menu_data()
+    assert len(dishes) == 200
+    assert len(repository.get_ingredients_data()) == len(dataset.ingredients)
+    assert set(dataset.ingredients["menu"]) <= {dish.name for dish in dishes}
+
+    menu_list, date_list = repository.get_recent_menu()
+    assert len(menu_list) == len(date_list) == 15
+    assert date_list[0] == today_in_japan()
+    assert date_list == sorted(date_list, reverse=True)
+
+    weekly_menu = get_weekly_dish(MenuCatalog.from_menus(dishes), menu_list)
+    index = IngredientIndex(repository.get_ingredients_data())
+    assert all(index.lines_for(menu.name) for menu in weekly_menu)
+
+
+def test_sqlite_history_without_households_is_migrated(tmp_path):
+    path = str(tmp_path / "dish.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE dish_history (date TEXT PRIMARY KEY, menu TEXT)")
+        conn.execute("INSERT INTO dish_history VALUES (?, ?)", (today_in_japan().isoformat(), "カレー"))
+    conn.close()
+
+    repository = SQLiteRepository(path)
+    assert repository.get_recent_menu() == (["カレー"], [today_in_japan()])
+    assert repository.get_recent_menu(household="other") == ([], [])
+
+
+def test_bigquery_history_without_households_is_read_as_default(monkeypatch):
+    today = today_in_japan()
+    queries = []
+    job = SimpleNamespace(result=lambda: None, job_id="job", num_dml_affected_rows=1, total_bytes_processed=0, total_bytes_billed=0)
+    client = SimpleNamespace(
+        get_table=lambda table: SimpleNamespace(schema=[SimpleNamespace(name="date"), SimpleNamespace(name="menu")]),
+        query=lambda query, job_config=None: queries.append(query) or job,
+    )
+    monkeypatch.setattr("lib.repository.get_bigquery_client", lambda: client)
+    monkeypatch.setattr(
+        "lib.repository.fetch_columns", lambda query, job_config=None, table="query": queries.append(query) or {"menu": ["カレー"], "date": [today]}
+    )
+    repository = BigQueryRepository()
+
+    # household_id 列を追加する前のテーブルは、すべて DEFAULT_HOUSEHOLD の履歴として読み書きする
+    assert repository.get_recent_menu() == (["カレー"], [today])
+    assert repository.get_recent_menu(household="other") == ([], [])
+    repository.register_dish_history(pd.DataFrame({"date": [today], "menu": ["餃子"]}))
+    assert len(queries) == 2 and not any("household_id" in query for query in queries)
+    with pytest.raises(ValueError):
+        repository.register_dish_history(pd.DataFrame({"date": [today], "menu": ["餃子"], "household_id": ["other"]}))